@@ -1,4 +1,10 @@
-from validatr.api.models import Asset, FILE_PROVIDERS
+from validatr.api.models import (
+    Asset,
+    Batch,
+    ProfileReport,
+    ValidationProfile,
+    FILE_PROVIDERS,
+)
 
 from rest_framework import serializers
 
@@ -17,6 +23,16 @@ class AssetPathSerializer(serializers.Serializer):
 class CreateAssetRequestSerializer(serializers.Serializer):
     assetPath = AssetPathSerializer(required=True)
     notifications = NotificationURLSerializer(required=True)
+    profile = serializers.SlugRelatedField(
+        slug_field="name",
+        queryset=ValidationProfile.objects.all(),
+        required=False,
+    )
+    batch = serializers.PrimaryKeyRelatedField(
+        queryset=Batch.objects.all(),
+        required=False,
+    )
+    profiling = serializers.BooleanField(required=False, default=False)
 
 
 class GetAssetResponseSerializer(serializers.ModelSerializer):
@@ -28,6 +44,18 @@ class GetAssetResponseSerializer(serializers.ModelSerializer):
         )
 
 
+class GetCompleteAssetResponseSerializer(serializers.ModelSerializer):
+    derivativePath = serializers.CharField(source="derivative_path")
+
+    class Meta:
+        model = Asset
+        fields = (
+            "id",
+            "state",
+            "derivativePath",
+        )
+
+
 class GetAssetWithErrorsResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Asset
@@ -36,3 +64,15 @@ class GetAssetWithErrorsResponseSerializer(serializers.ModelSerializer):
             "state",
             "errors",
         )
+
+
+class GetProfileReportResponseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProfileReport
+        fields = (
+            "validator",
+            "kind",
+            "duration_ms",
+            "stats",
+            "created_at",
+        )
@@ -1,14 +1,17 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 from rest_framework import status, viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
-from validatr.api.models import Asset
+from validatr.api.models import Asset, Batch, COMPLETE
 from validatr.api.assets.serializers import (
     CreateAssetRequestSerializer,
     GetAssetResponseSerializer,
+    GetCompleteAssetResponseSerializer,
     GetAssetWithErrorsResponseSerializer,
+    GetProfileReportResponseSerializer,
 )
 
 from validatr.pipeline.tasks import run_pipeline
@@ -42,11 +45,27 @@ class AssetViewset(viewsets.ViewSet, viewsets.GenericViewSet):
 
         if asset.errors:
             serializer = GetAssetWithErrorsResponseSerializer(asset)
+        elif asset.state == COMPLETE and asset.derivative_path:
+            serializer = GetCompleteAssetResponseSerializer(asset)
         else:
             serializer = GetAssetResponseSerializer(asset)
 
         return Response(serializer.data)
 
+    @action(methods=["get"], detail=True)
+    def profiles(self, request, pk=None):
+        """
+        List the profiles captured while validating an asset.
+
+        GET /api/assets/{asset_id}/profiles
+        """
+        asset = get_object_or_404(self.queryset, id=pk)
+
+        serializer = GetProfileReportResponseSerializer(
+            asset.profile_reports.order_by("created_at"), many=True
+        )
+        return Response(serializer.data)
+
     @action(methods=["post"], url_path="image", detail=False)
     def create_asset(self, request):
         """
@@ -60,19 +79,30 @@ class AssetViewset(viewsets.ViewSet, viewsets.GenericViewSet):
 
         data = serializer.validated_data
 
-        # create asset
-        asset = Asset.objects.create(
-            path=data["assetPath"]["path"],
-            provider=data["assetPath"]["location"],
-            start_webhook_endpoint=data["notifications"]["onStart"],
-            success_webhook_endpoint=data["notifications"]["onSuccess"],
-            failure_webhook_endpoint=data["notifications"]["onFailure"],
-            state="queued",
-        )
+        with transaction.atomic():
+            # Count the asset in its batch, unless the batch has been closed.
+            batch = data.get("batch")
+            if batch and not Batch.objects.add_assets(batch.id):
+                return Response(
+                    {"batch": ["Batch is closed."]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            # create asset
+            asset = Asset.objects.create(
+                path=data["assetPath"]["path"],
+                provider=data["assetPath"]["location"],
+                start_webhook_endpoint=data["notifications"]["onStart"],
+                success_webhook_endpoint=data["notifications"]["onSuccess"],
+                failure_webhook_endpoint=data["notifications"]["onFailure"],
+                profile=data.get("profile"),
+                batch=batch,
+                state="queued",
+            )
 
         resp = GetAssetResponseSerializer(asset).data
 
-        run_pipeline(asset.id)
+        run_pipeline(asset, profiling=data["profiling"])
         return Response(resp, status=status.HTTP_202_ACCEPTED)
 
 
@@ -0,0 +1,24 @@
+from validatr.api.models import Batch
+
+from rest_framework import serializers
+
+
+class CreateBatchRequestSerializer(serializers.Serializer):
+    name = serializers.CharField(required=False, allow_blank=True, max_length=255)
+    onComplete = serializers.CharField(required=False)
+
+
+class GetBatchResponseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Batch
+        fields = (
+            "id",
+            "name",
+            "total",
+            "queued",
+            "in_progress",
+            "complete",
+            "failed",
+            "closed",
+            "completed_at",
+        )
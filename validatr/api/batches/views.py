@@ -0,0 +1,68 @@
+from django.shortcuts import get_object_or_404
+
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from validatr.api.models import Batch
+from validatr.api.batches.serializers import (
+    CreateBatchRequestSerializer,
+    GetBatchResponseSerializer,
+)
+from validatr.pipeline.tasks import notify_batch
+
+
+class BatchViewset(viewsets.ViewSet, viewsets.GenericViewSet):
+
+    queryset = Batch.objects.all()
+    serializer_class = GetBatchResponseSerializer
+
+    def create(self, request):
+        """
+        Create a new batch, that assets can be added to.
+
+        POST /batches/
+        """
+        serializer = CreateBatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+
+        batch = Batch.objects.create(
+            name=data.get("name", ""),
+            complete_webhook_endpoint=data.get("onComplete"),
+        )
+
+        resp = GetBatchResponseSerializer(batch).data
+        return Response(resp, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        """
+        Fetch a batch, with how many of its assets are in each state. This
+        reads a single row, however large the batch.
+
+        GET /batches/{batch_id}
+        """
+        batch = get_object_or_404(self.queryset, id=pk)
+
+        return Response(GetBatchResponseSerializer(batch).data)
+
+    @action(methods=["post"], detail=True)
+    def close(self, request, pk=None):
+        """
+        Close a batch, once every asset has been added to it. Its completion
+        webhook is sent once all of its assets are validated.
+
+        POST /batches/{batch_id}/close/
+        """
+        batch = get_object_or_404(self.queryset, id=pk)
+
+        Batch.objects.filter(id=batch.id).update(closed=True)
+
+        # The batch's assets may all have been validated already.
+        if Batch.objects.finish(batch.id):
+            notify_batch.delay(str(batch.id))
+
+        batch.refresh_from_db()
+        return Response(GetBatchResponseSerializer(batch).data)
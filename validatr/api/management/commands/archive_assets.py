@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from validatr.pipeline.archive import archive_assets
+
+
+class Command(BaseCommand):
+    """
+    Django command to move complete and failed assets older than a number of
+    days out of the db, into a gzipped newline delimited JSON file. The
+    `archive_expired` task does the same on a schedule, under Celery beat,
+    when ASSET_RETENTION_DAYS is set.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.ASSET_RETENTION_DAYS,
+            help="archive assets created more than this many days ago, ASSET_RETENTION_DAYS by default",
+        )
+        parser.add_argument(
+            "--output-dir",
+            help="where to write the archive, ASSET_ARCHIVE_DIR by default",
+        )
+        parser.add_argument("--chunk-size", type=int)
+
+    def handle(self, *args, **options):
+        if options["days"] <= 0:
+            raise CommandError("--days must be set, as ASSET_RETENTION_DAYS is 0")
+
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        archived, path = archive_assets(
+            cutoff, options["output_dir"], options["chunk_size"]
+        )
+        if not archived:
+            self.stdout.write("no assets to archive")
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"archived {archived} assets to {path}")
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from validatr.api.models import Asset
+
+
+class Command(BaseCommand):
+    """
+    Django command to print the profiles captured while validating an asset.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("asset_id")
+        parser.add_argument("--validator", help="only print this validator's profiles")
+
+    def handle(self, *args, **options):
+        try:
+            asset = Asset.objects.get(id=options["asset_id"])
+        except (Asset.DoesNotExist, ValueError):
+            raise CommandError(f"Unknown asset: {options['asset_id']}")
+
+        reports = asset.profile_reports.order_by("created_at")
+        if options["validator"]:
+            reports = reports.filter(validator=options["validator"])
+
+        for report in reports:
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(
+                    f"{report.validator} ({report.kind}, {report.duration_ms:.1f}ms)"
+                )
+            )
+            self.stdout.write(report.stats)
@@ -0,0 +1,56 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from validatr.api.models import Asset, IN_PROGRESS
+from validatr.utils.connections import stats
+
+
+class Command(BaseCommand):
+    """
+    Django command to measure the per-task db latency, with and without
+    persistent connections.
+
+    Each iteration runs the query `start_pipeline` makes. The "per-task" run
+    closes the connection before every iteration, like Celery does by default,
+    while the "persistent" run keeps it, like CONN_MAX_AGE does.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=500)
+
+    def handle(self, *args, **options):
+        asset = Asset.objects.create(path="/benchmark/asset.jpg")
+
+        try:
+            for name, reconnect in [("per-task", True), ("persistent", False)]:
+                self.run(name, asset.id, options["iterations"], reconnect)
+        finally:
+            asset.delete()
+
+    def run(self, name, asset_id, iterations, reconnect):
+        opened = stats["connections"]
+        timings = []
+
+        for _ in range(iterations):
+            if reconnect:
+                connection.close()
+
+            start = time.perf_counter()
+            close_old_connections()
+            Asset.objects.filter(id=asset_id).update(
+                state=IN_PROGRESS, updated_at=timezone.now()
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        self.stdout.write(
+            f"{name}: "
+            f"mean:{statistics.mean(timings):.3f}ms "
+            f"p50:{timings[len(timings) // 2]:.3f}ms "
+            f"p95:{timings[int(len(timings) * 0.95)]:.3f}ms "
+            f"connections:{stats['connections'] - opened}"
+        )
@@ -0,0 +1,65 @@
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from validatr.pipeline import offload
+from validatr.pipeline.pixels import decode_image, measure_pixels
+
+
+def _verify(path):
+    offload.offload(decode_image, path)
+    offload.offload(measure_pixels, path)
+
+
+class Command(BaseCommand):
+    """
+    Django command to measure deep verification throughput, with decoding done
+    in worker threads, and offloaded to a decode pool.
+
+    Threads stand in for a `threads` pool Celery worker. Each image gets the
+    full decode and pixel statistics the pipeline runs.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="image to decode")
+        parser.add_argument("--images", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--processes", type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        configured = settings.PIPELINE_DECODE_PROCESSES
+        try:
+            for name, processes in [
+                ("in-thread", 0),
+                ("offloaded", options["processes"]),
+            ]:
+                settings.PIPELINE_DECODE_PROCESSES = processes
+                self.run(name, processes, options)
+        finally:
+            settings.PIPELINE_DECODE_PROCESSES = configured
+
+    def run(self, name, processes, options):
+        paths = [options["path"]] * options["images"]
+
+        with ThreadPoolExecutor(max_workers=options["threads"]) as threads:
+            # Start the pool, and warm every thread, before timing.
+            list(threads.map(_verify, paths[: options["threads"]]))
+
+            start = time.perf_counter()
+            list(threads.map(_verify, paths))
+            elapsed = time.perf_counter() - start
+
+        if offload._pool is not None:
+            offload._pool.shutdown()
+            offload._pool = None
+
+        self.stdout.write(
+            f"{name}: "
+            f"{len(paths) / elapsed:.1f} images/s "
+            f"threads:{options['threads']} "
+            f"processes:{processes}"
+        )
@@ -0,0 +1,73 @@
+import json
+import subprocess
+import sys
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+# Downscales an image repeatedly in a fresh interpreter, so that its peak
+# memory is the downscale's alone, and reports the time taken and the peak
+# resident set size over the interpreter's size before it started. The
+# current size is read from /proc, so this only runs on Linux.
+DOWNSCALE_SCRIPT = """
+import json, os, resource, time
+
+from validatr.pipeline.derivatives import downscale
+
+with open("/proc/self/status") as f:
+    status = dict(line.split(":", 1) for line in f)
+baseline = int(status["VmRSS"].split()[0])
+
+start = time.perf_counter()
+for i in range(IMAGES):
+    downscale(PATH, os.path.join(OUTPUT_DIR, f"{i}.jpg"), MAX_DIMENSION, draft=DRAFT)
+elapsed = time.perf_counter() - start
+
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+print(json.dumps({"elapsed": elapsed, "peak_kb": peak - baseline}))
+"""
+
+
+class Command(BaseCommand):
+    """
+    Django command to measure the throughput and peak memory of downscaling
+    an oversized image into a derivative, with and without JPEG draft mode.
+
+    The "full" runs decode the image at full size before resampling it, the
+    "draft" runs have the JPEG decoder scale it down as it decodes.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="image to downscale")
+        parser.add_argument("--images", type=int, default=20)
+        parser.add_argument("--max-dimension", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for name, draft in [("full", False), ("draft", True)]:
+            self.run(name, draft, options)
+
+    def run(self, name, draft, options):
+        with tempfile.TemporaryDirectory() as output_dir:
+            script = (
+                f"PATH = {options['path']!r}\n"
+                f"OUTPUT_DIR = {output_dir!r}\n"
+                f"IMAGES = {options['images']!r}\n"
+                f"MAX_DIMENSION = {options['max_dimension']!r}\n"
+                f"DRAFT = {draft!r}\n"
+                f"{DOWNSCALE_SCRIPT}"
+            )
+            out = subprocess.run(
+                [sys.executable, "-c", script],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout
+
+        result = json.loads(out)
+        self.stdout.write(
+            f"{name}: "
+            f"{options['images'] / result['elapsed']:.1f} images/s "
+            f"peak:{result['peak_kb'] / 1024:.1f}MiB "
+            f"max-dimension:{options['max_dimension']}"
+        )
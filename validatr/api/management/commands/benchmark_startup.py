@@ -0,0 +1,79 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+
+# Boots the Celery app the way `celery worker` does, in a fresh interpreter,
+# and reports how long it took and what it imported.
+BOOT_SCRIPT = """
+import json, sys, time
+
+start = time.perf_counter()
+from validatr import celery_app
+celery_app.loader.import_default_modules()
+boot = time.perf_counter() - start
+
+loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+tasks = sorted(name for name in celery_app.tasks if name.startswith("validatr."))
+
+start = time.perf_counter()
+import validatr.pipeline.pixels, validatr.pipeline.dedupe
+deferred = time.perf_counter() - start
+
+print(json.dumps({
+    "boot": boot,
+    "deferred": deferred,
+    "loaded": loaded,
+    "tasks": tasks,
+}))
+"""
+
+# Modules a worker shouldn't need to import before it takes its first task.
+HEAVY_MODULES = ["rest_framework.serializers", "numpy", "validators"]
+
+
+class Command(BaseCommand):
+    """
+    Django command to measure how long a worker process takes to boot.
+
+    Each run starts a new interpreter, loads the Celery app and imports the
+    task modules, and then imports the modules that are loaded lazily, on the
+    first task that needs them. The "checks" runs boot with Django's system
+    checks enabled, as Celery does by default, the "slim" runs without.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        for name, skip_checks in [("checks", ""), ("slim", "true")]:
+            self.run(name, skip_checks, options["runs"])
+
+    def run(self, name, skip_checks, runs):
+        env = dict(os.environ, CELERY_SKIP_CHECKS=skip_checks)
+        script = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{BOOT_SCRIPT}"
+
+        results = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", script],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results.append(json.loads(output.splitlines()[-1]))
+
+        boots = [result["boot"] * 1000 for result in results]
+        deferred = [result["deferred"] * 1000 for result in results]
+        self.stdout.write(
+            f"{name}: "
+            f"boot mean:{statistics.mean(boots):.1f}ms "
+            f"min:{min(boots):.1f}ms "
+            f"deferred:{statistics.mean(deferred):.1f}ms "
+            f"tasks:{len(results[0]['tasks'])} "
+            f"loaded:{','.join(results[0]['loaded']) or '-'}"
+        )
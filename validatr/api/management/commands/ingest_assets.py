@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from validatr.api.models import Asset, ValidationProfile, QUEUED
+from validatr.pipeline.tasks import snapshot_asset, start_pipelines
+
+# How many directories are scanned at once when crawling.
+SCAN_BATCH_SIZE = 64
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_ndjson(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _scan(path):
+    """List the files and subdirectories of a single directory."""
+    files, dirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.path)
+            elif entry.is_file():
+                files.append(entry.path)
+
+    return files, dirs
+
+
+def crawl(root, workers):
+    """
+    Walk a directory tree breadth first, scanning directories in parallel.
+
+    Directories are scanned in batches and their results consumed in order,
+    so an unchanged tree is always walked in the same order, which is what
+    lets an interrupted ingest be resumed.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        level = [root]
+        while level:
+            next_level = []
+            for start in range(0, len(level), SCAN_BATCH_SIZE):
+                batch = level[start : start + SCAN_BATCH_SIZE]
+                for files, dirs in pool.map(_scan, batch):
+                    next_level.extend(dirs)
+                    for path in files:
+                        yield {"path": path}
+
+            level = next_level
+
+
+class Checkpoint:
+    """
+    Tracks how many entries of a source have been ingested, in a json file.
+
+    Asset ids are derived from the run id stored in the checkpoint, and the
+    entry's position in the source, so re-inserting a batch that was written
+    before a crash is a no-op.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.state = {"source": source, "run": str(uuid.uuid4()), "done": 0}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state["source"] != source:
+                raise CommandError(f"Checkpoint {path} is for {state['source']}")
+            self.state = state
+
+    @property
+    def done(self):
+        return self.state["done"]
+
+    def asset_id(self, position):
+        return uuid.uuid5(uuid.UUID(self.state["run"]), str(position))
+
+    def save(self, done):
+        self.state["done"] = done
+        if not self.path:
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+class Command(BaseCommand):
+    """
+    Django command to bulk ingest assets from a manifest, or a directory tree.
+
+    Manifests are CSV or NDJSON files, with a `path` for each asset, and
+    optionally `location`, `onStart`, `onSuccess` and `onFailure`. Entries
+    are streamed, inserted in batches, and enqueued one message per batch.
+
+    Every asset needs all three webhooks to pass validation, so each one the
+    manifest doesn't supply for an entry must be passed as an option.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="a .csv/.ndjson manifest, or a directory")
+        parser.add_argument("--profile", help="name of the validation profile")
+        parser.add_argument("--on-start")
+        parser.add_argument("--on-success")
+        parser.add_argument("--on-failure")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--enqueue-size", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument(
+            "--checkpoint", help="file to record progress in, to resume from"
+        )
+
+    def handle(self, *args, **options):
+        source = os.path.abspath(options["source"])
+        if os.path.isdir(source):
+            entries = crawl(source, options["workers"])
+        elif source.endswith(".csv"):
+            entries = read_csv(source)
+        elif source.endswith((".ndjson", ".jsonl")):
+            entries = read_ndjson(source)
+        else:
+            raise CommandError("source must be a directory, .csv or .ndjson file")
+
+        hooks = {
+            "onStart": options["on_start"],
+            "onSuccess": options["on_success"],
+            "onFailure": options["on_failure"],
+        }
+        if os.path.isdir(source) and not all(hooks.values()):
+            raise CommandError(
+                "--on-start, --on-success and --on-failure are required "
+                "when ingesting a directory"
+            )
+
+        profile = None
+        if options["profile"]:
+            try:
+                profile = ValidationProfile.objects.get(name=options["profile"])
+            except ValidationProfile.DoesNotExist:
+                raise CommandError(f"Unknown profile: {options['profile']}")
+
+        checkpoint = Checkpoint(options["checkpoint"], source)
+        if checkpoint.done:
+            self.stdout.write(f"resuming after {checkpoint.done} entries ...")
+
+        position = checkpoint.done
+        entries = islice(entries, checkpoint.done, None)
+
+        # Only the first batch after the checkpoint can have been inserted, and
+        # some of it enqueued, before the ingest was interrupted.
+        resuming = bool(checkpoint.done)
+
+        while True:
+            batch = []
+            for entry in islice(entries, options["batch_size"]):
+                urls = {name: entry.get(name) or url for name, url in hooks.items()}
+                for name, url in urls.items():
+                    if not url:
+                        raise CommandError(
+                            f"Entry {position} ({entry['path']}) has no {name} "
+                            f"url, add it to the manifest or pass it as an option"
+                        )
+
+                batch.append(
+                    Asset(
+                        id=checkpoint.asset_id(position),
+                        path=entry["path"],
+                        provider=entry.get("location") or "local",
+                        start_webhook_endpoint=urls["onStart"],
+                        success_webhook_endpoint=urls["onSuccess"],
+                        failure_webhook_endpoint=urls["onFailure"],
+                        profile=profile,
+                        state=QUEUED,
+                    )
+                )
+                position += 1
+
+            if not batch:
+                break
+
+            Asset.objects.bulk_create(batch, ignore_conflicts=True)
+
+            # Assets the interrupted ingest inserted, and that have already
+            # started validating, aren't enqueued again.
+            if resuming:
+                queued = set(
+                    Asset.objects.filter(
+                        id__in=[asset.id for asset in batch], state=QUEUED
+                    ).values_list("id", flat=True)
+                )
+                batch = [asset for asset in batch if asset.id in queued]
+                resuming = False
+
+            snapshots = [snapshot_asset(asset) for asset in batch]
+            for start in range(0, len(snapshots), options["enqueue_size"]):
+                start_pipelines.delay(
+                    snapshots[start : start + options["enqueue_size"]]
+                )
+
+            checkpoint.save(position)
+            self.stdout.write(f"ingested {position} entries ...")
+
+        self.stdout.write(self.style.SUCCESS(f"ingested {position} entries"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from validatr.pipeline.tasks import reap_stalled_assets
+
+
+class Command(BaseCommand):
+    """
+    Django command to resume the pipelines of assets that have stalled in
+    progress, from their last checkpoint. The `reap_stalled` task does the
+    same on a schedule, under Celery beat.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stalled-seconds",
+            type=int,
+            help="how long an asset must go without progress, PIPELINE_STALL_SECONDS by default",
+        )
+
+    def handle(self, *args, **options):
+        resumed = reap_stalled_assets(options["stalled_seconds"])
+        self.stdout.write(self.style.SUCCESS(f"resumed {resumed} stalled assets"))
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from validatr.pipeline.dedupe import build_snapshot
+
+
+class Command(BaseCommand):
+    """
+    Django command to save a snapshot of the near-duplicate index, which
+    workers map on their next refresh. The `snapshot_hashes` task does the
+    same on a schedule, under Celery beat.
+    """
+
+    def handle(self, *args, **options):
+        if not settings.PIPELINE_DEDUPE_SNAPSHOT_DIR:
+            raise CommandError("PIPELINE_DEDUPE_SNAPSHOT_DIR isn't set")
+
+        count = build_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"snapshotted {count} hashes"))
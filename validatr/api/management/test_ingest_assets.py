@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from validatr.api.models import Asset
+from validatr.pipeline.profiles import get_rules
+from validatr.pipeline.tasks import check_webhook_urls, snapshot_asset
+
+
+@patch("validatr.api.management.commands.ingest_assets.start_pipelines")
+class IngestAssetsTestCase(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+        self.manifest = os.path.join(self.tmp_dir, "manifest.csv")
+        with open(self.manifest, "w") as f:
+            f.write("path,onSuccess\n")
+            for i in range(5):
+                f.write(f"/assets/{i}.jpg,http://fake-success-endpoint.com/\n")
+
+        self.checkpoint = os.path.join(self.tmp_dir, "checkpoint.json")
+
+    def _ingest(self, source, **options):
+        options = {
+            "on_start": "http://fake-start-endpoint.com/",
+            "on_failure": "http://fake-failure-endpoint.com/",
+            **options,
+        }
+        call_command(
+            "ingest_assets",
+            source,
+            checkpoint=self.checkpoint,
+            stdout=open(os.devnull, "w"),
+            **options,
+        )
+
+    def test_ingest_manifest(self, start_pipelines):
+        self._ingest(self.manifest, batch_size=2, enqueue_size=1)
+
+        self.assertEqual(Asset.objects.count(), 5)
+        asset = Asset.objects.get(path="/assets/3.jpg")
+        self.assertEqual(
+            asset.success_webhook_endpoint, "http://fake-success-endpoint.com/"
+        )
+        self.assertEqual(
+            asset.failure_webhook_endpoint, "http://fake-failure-endpoint.com/"
+        )
+
+        self.assertEqual(start_pipelines.delay.call_count, 5)
+        self.assertEqual(
+            start_pipelines.delay.call_args_list[3].args[0][0]["path"], "/assets/3.jpg"
+        )
+
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)["done"], 5)
+
+        # Ingested assets have every webhook they need to pass validation.
+        snapshot = snapshot_asset(asset)
+        self.assertEqual(check_webhook_urls(snapshot, get_rules(snapshot)), {})
+
+    def test_missing_webhooks(self, start_pipelines):
+        # The manifest has no onStart urls, so --on-start is required.
+        with self.assertRaisesMessage(CommandError, "no onStart url"):
+            self._ingest(self.manifest, on_start=None)
+        self.assertFalse(Asset.objects.exists())
+
+        with self.assertRaisesMessage(CommandError, "--on-success"):
+            self._ingest(self.tmp_dir)
+
+    def test_resume_from_checkpoint(self, start_pipelines):
+        self._ingest(self.manifest, batch_size=2)
+
+        # Pretend the ingest crashed after the second batch was inserted, but
+        # before its checkpoint was saved.
+        with open(self.checkpoint) as f:
+            state = json.load(f)
+        with open(self.checkpoint, "w") as f:
+            json.dump({**state, "done": 2}, f)
+
+        # One of the assets it inserted has since been validated.
+        Asset.objects.filter(path="/assets/2.jpg").update(state="complete")
+
+        start_pipelines.reset_mock()
+        self._ingest(self.manifest, batch_size=2)
+
+        self.assertEqual(Asset.objects.count(), 5)
+        enqueued = [
+            snapshot["path"]
+            for call in start_pipelines.delay.call_args_list
+            for snapshot in call.args[0]
+        ]
+        self.assertEqual(enqueued, ["/assets/3.jpg", "/assets/4.jpg"])
+
+    def test_ingest_directory(self, start_pipelines):
+        root = os.path.join(self.tmp_dir, "tree")
+        for subdir in ["a", "a/b", "c"]:
+            os.makedirs(os.path.join(root, subdir))
+            for i in range(3):
+                open(os.path.join(root, subdir, f"{i}.jpg"), "w").close()
+
+        self._ingest(root, workers=2, on_success="http://fake-success-endpoint.com/")
+
+        self.assertEqual(Asset.objects.count(), 9)
+        self.assertTrue(
+            Asset.objects.filter(path=os.path.join(root, "a", "b", "2.jpg")).exists()
+        )
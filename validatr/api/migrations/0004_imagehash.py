@@ -0,0 +1,37 @@
+# Generated by Django 4.1.1 on 2026-10-19 17:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_alter_asset_failure_webhook_endpoint_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageHash",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("phash", models.BigIntegerField()),
+                (
+                    "asset",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="image_hash",
+                        to="api.asset",
+                    ),
+                ),
+            ],
+        ),
+    ]
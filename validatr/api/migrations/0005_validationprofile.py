@@ -0,0 +1,51 @@
+# Generated by Django 4.1.1 on 2026-10-19 17:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import validatr.api.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_imagehash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ValidationProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.SlugField(max_length=64, unique=True)),
+                ("version", models.PositiveIntegerField(default=1, editable=False)),
+                (
+                    "allowed_formats",
+                    models.JSONField(default=validatr.api.models.default_formats),
+                ),
+                ("min_dimension", models.PositiveIntegerField(default=0)),
+                ("max_dimension", models.PositiveIntegerField(default=1000)),
+                ("max_bytes", models.PositiveBigIntegerField(blank=True, null=True)),
+                ("pixel_checks", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="asset",
+            name="profile",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                to="api.validationprofile",
+            ),
+        ),
+    ]
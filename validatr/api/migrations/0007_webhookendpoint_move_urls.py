@@ -0,0 +1,54 @@
+# Generated by Django 4.1.1 on 2026-10-19 17:50
+
+from django.db import migrations
+import validators
+
+HOOKS = [
+    ("start_webhook_endpoint", "start_webhook"),
+    ("success_webhook_endpoint", "success_webhook"),
+    ("failure_webhook_endpoint", "failure_webhook"),
+]
+
+
+def move_webhooks_to_endpoints(apps, schema_editor):
+    """Register every distinct webhook url, and point assets at it."""
+    Asset = apps.get_model("api", "Asset")
+    WebhookEndpoint = apps.get_model("api", "WebhookEndpoint")
+
+    for url_field, fk_field in HOOKS:
+        urls = (
+            Asset.objects.exclude(**{f"{url_field}__isnull": True})
+            .values_list(url_field, flat=True)
+            .distinct()
+        )
+        for url in urls.iterator():
+            endpoint, _ = WebhookEndpoint.objects.get_or_create(
+                url=url, defaults={"is_valid": bool(validators.url(url))}
+            )
+            Asset.objects.filter(**{url_field: url}).update(**{fk_field: endpoint})
+
+
+def move_webhooks_to_assets(apps, schema_editor):
+    """Copy every endpoint's url back onto the assets pointing at it."""
+    Asset = apps.get_model("api", "Asset")
+    WebhookEndpoint = apps.get_model("api", "WebhookEndpoint")
+
+    for endpoint in WebhookEndpoint.objects.iterator():
+        for url_field, fk_field in HOOKS:
+            Asset.objects.filter(**{fk_field: endpoint}).update(
+                **{url_field: endpoint.url}
+            )
+
+
+# The webhook urls are moved in their own migration, so that the foreign key
+# constraint checks it queues run when it commits, rather than blocking the
+# `ALTER TABLE` that drops the url columns, on PostgreSQL.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_webhookendpoint"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_webhooks_to_endpoints, move_webhooks_to_assets),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.1 on 2026-10-19 17:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_webhookendpoint_move_urls"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="asset",
+            name="failure_webhook_endpoint",
+        ),
+        migrations.RemoveField(
+            model_name="asset",
+            name="start_webhook_endpoint",
+        ),
+        migrations.RemoveField(
+            model_name="asset",
+            name="success_webhook_endpoint",
+        ),
+    ]
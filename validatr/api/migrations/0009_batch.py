@@ -0,0 +1,61 @@
+# Generated by Django 4.1.1 on 2026-10-19 17:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_webhookendpoint_remove_urls"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Batch",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("name", models.CharField(blank=True, default="", max_length=255)),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("queued", models.IntegerField(default=0)),
+                ("in_progress", models.IntegerField(default=0)),
+                ("complete", models.IntegerField(default=0)),
+                ("failed", models.IntegerField(default=0)),
+                ("closed", models.BooleanField(default=False)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "complete_webhook",
+                    models.ForeignKey(
+                        blank=True,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="api.webhookendpoint",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="asset",
+            name="batch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="assets",
+                to="api.batch",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.1 on 2026-10-19 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_profilereport"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="asset",
+            name="checkpoint",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="asset",
+            index=models.Index(
+                fields=["state", "updated_at"], name="api_asset_state_c59785_idx"
+            ),
+        ),
+    ]
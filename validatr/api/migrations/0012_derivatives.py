@@ -0,0 +1,23 @@
+# Generated by Django 4.1.1 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_asset_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="asset",
+            name="derivative_path",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="validationprofile",
+            name="downscale",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.1 on 2026-10-19 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_derivatives"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="asset",
+            index=models.Index(
+                fields=["created_at", "id"], name="api_asset_created_b6daf5_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.1 on 2026-10-19 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0013_asset_created_at_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="validationprofile",
+            name="pixel_checks",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.1 on 2026-10-19 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_alter_validationprofile_pixel_checks"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="asset",
+            name="pipeline_run",
+            field=models.UUIDField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.1 on 2026-10-19 18:45
+
+from django.db import migrations, models
+
+
+# The foreign key is replaced by a plain uuid column, keeping the existing
+# `asset_id` column and its values: the constraint is dropped first, then the
+# field is renamed to its column's name.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0015_asset_pipeline_run"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="imagehash",
+            name="asset",
+            field=models.UUIDField(db_column="asset_id", unique=True),
+        ),
+        migrations.RenameField(
+            model_name="imagehash",
+            old_name="asset",
+            new_name="asset_id",
+        ),
+        migrations.AlterField(
+            model_name="imagehash",
+            name="asset_id",
+            field=models.UUIDField(unique=True),
+        ),
+    ]
@@ -1,5 +1,8 @@
 import uuid
-from django.db import models
+
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 
 FILE_PROVIDERS = [
     ("local", "local"),
@@ -22,6 +25,217 @@ ASSET_STATES = [
     (FAILED, FAILED),
 ]
 
+CPROFILE = "cprofile"
+SAMPLED = "sampled"
+
+PROFILE_KINDS = [
+    (CPROFILE, CPROFILE),
+    (SAMPLED, SAMPLED),
+]
+
+
+# Webhook endpoints never change once registered, so each process caches them
+# by url and by id. The caches are cleared if they grow past this size.
+ENDPOINT_CACHE_SIZE = 10000
+
+_endpoints_by_url = {}
+_endpoints_by_id = {}
+
+
+class WebhookEndpointManager(models.Manager):
+    def _cache(self, endpoint):
+        def add():
+            if len(_endpoints_by_id) >= ENDPOINT_CACHE_SIZE:
+                self.clear_cache()
+
+            _endpoints_by_url[endpoint.url] = endpoint
+            _endpoints_by_id[endpoint.id] = endpoint
+
+        # Don't cache an endpoint created by a transaction that may still be
+        # rolled back.
+        transaction.on_commit(add)
+        return endpoint
+
+    def clear_cache(self):
+        _endpoints_by_url.clear()
+        _endpoints_by_id.clear()
+
+    def register(self, url):
+        """
+        Return the endpoint for a url, registering it, and validating it, the
+        first time it's seen.
+        """
+        if url in _endpoints_by_url:
+            return _endpoints_by_url[url]
+
+        import validators
+
+        endpoint, _ = self.get_or_create(
+            url=url, defaults={"is_valid": bool(validators.url(url))}
+        )
+        return self._cache(endpoint)
+
+    def get_cached(self, endpoint_id):
+        """Return the endpoint with the given id, from the cache if possible."""
+        if endpoint_id in _endpoints_by_id:
+            return _endpoints_by_id[endpoint_id]
+
+        return self._cache(self.get(id=endpoint_id))
+
+
+class WebhookEndpoint(models.Model):
+    """
+    A webhook url, stored once and shared by every asset that notifies it.
+    """
+
+    url = models.TextField(unique=True)
+    is_valid = models.BooleanField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = WebhookEndpointManager()
+
+
+def _webhook_property(field):
+    """
+    Expose a webhook endpoint foreign key as its url, so that assets can still
+    be read and created with plain webhook urls.
+    """
+
+    def getter(self):
+        endpoint_id = getattr(self, f"{field}_id")
+        if endpoint_id is None:
+            return None
+
+        return WebhookEndpoint.objects.get_cached(endpoint_id).url
+
+    def setter(self, url):
+        endpoint_id = None
+        if url is not None:
+            endpoint_id = WebhookEndpoint.objects.register(url).id
+
+        setattr(self, f"{field}_id", endpoint_id)
+
+    return property(getter, setter)
+
+
+def default_formats():
+    return ["JPEG"]
+
+
+class ValidationProfile(models.Model):
+    """
+    A named set of validation rules, that assets can be validated against.
+    """
+
+    name = models.SlugField(max_length=64, unique=True)
+
+    # Bumped on every change, so that workers know to recompile their cached
+    # copy of the profile's rules.
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    allowed_formats = models.JSONField(default=default_formats)
+    min_dimension = models.PositiveIntegerField(default=0)
+    max_dimension = models.PositiveIntegerField(default=1000)
+    max_bytes = models.PositiveBigIntegerField(blank=True, null=True)
+    # Off by default, as they reject images that every other check accepts.
+    pixel_checks = models.BooleanField(default=False)
+
+    # Downscale images larger than max_dimension into a derivative, rather
+    # than rejecting them.
+    downscale = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        # Incremented in the db, so that concurrent edits each get their own
+        # version.
+        updating = self.pk is not None
+        if updating:
+            self.version = F("version") + 1
+
+        super().save(*args, **kwargs)
+
+        if updating:
+            self.refresh_from_db(fields=["version"])
+
+
+class BatchManager(models.Manager):
+    """
+    Maintains each batch's per-state asset counters with atomic increments,
+    so reading a batch's progress never has to count its assets.
+    """
+
+    def add_assets(self, batch_id, count=1):
+        """
+        Count new assets in the batch. Returns False if the batch is closed,
+        in which case nothing is counted.
+        """
+        return bool(
+            self.filter(id=batch_id, closed=False).update(
+                total=F("total") + count, queued=F(QUEUED) + count
+            )
+        )
+
+    def transition(self, batch_id, from_state, to_state):
+        """Move one of the batch's assets from one state's counter to another."""
+        return self.filter(id=batch_id).update(
+            **{from_state: F(from_state) - 1, to_state: F(to_state) + 1}
+        )
+
+    def finish(self, batch_id):
+        """
+        Mark the batch as complete, if it's closed and all of its assets are
+        done. Returns True only for the one caller that completes it.
+        """
+        return bool(
+            self.filter(
+                id=batch_id,
+                closed=True,
+                completed_at=None,
+                total__lte=F(COMPLETE) + F(FAILED),
+            ).update(completed_at=timezone.now())
+        )
+
+
+class Batch(models.Model):
+    """
+    A submission of assets, validated together.
+
+    A batch is complete once it's been closed, meaning no more assets will be
+    added to it, and every one of its assets has been validated.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255, blank=True, default="")
+
+    complete_webhook = models.ForeignKey(
+        WebhookEndpoint,
+        blank=True,
+        null=True,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name="+",
+    )
+    complete_webhook_endpoint = _webhook_property("complete_webhook")
+
+    # How many of the batch's assets are in each state. The counter fields
+    # are named after the states.
+    total = models.PositiveIntegerField(default=0)
+    queued = models.IntegerField(default=0)
+    in_progress = models.IntegerField(default=0)
+    complete = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+
+    closed = models.BooleanField(default=False)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BatchManager()
+
 
 class Asset(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -29,13 +243,102 @@ class Asset(models.Model):
     path = models.TextField(blank=False, null=False)
     provider = models.CharField(max_length=16, choices=FILE_PROVIDERS, default=0)
 
-    start_webhook_endpoint = models.TextField(blank=True, null=True)
-    success_webhook_endpoint = models.TextField(blank=True, null=True)
-    failure_webhook_endpoint = models.TextField(blank=True, null=True)
+    # Nearly all assets in a batch share the same few endpoints, so they're
+    # stored once and referenced by id. Endpoints are never deleted, so the
+    # foreign keys don't need an index.
+    start_webhook = models.ForeignKey(
+        WebhookEndpoint,
+        blank=True,
+        null=True,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name="+",
+    )
+    success_webhook = models.ForeignKey(
+        WebhookEndpoint,
+        blank=True,
+        null=True,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name="+",
+    )
+    failure_webhook = models.ForeignKey(
+        WebhookEndpoint,
+        blank=True,
+        null=True,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name="+",
+    )
+
+    start_webhook_endpoint = _webhook_property("start_webhook")
+    success_webhook_endpoint = _webhook_property("success_webhook")
+    failure_webhook_endpoint = _webhook_property("failure_webhook")
 
     state = models.CharField(max_length=16, choices=ASSET_STATES, default="queued")
 
+    profile = models.ForeignKey(
+        ValidationProfile, blank=True, null=True, on_delete=models.PROTECT
+    )
+
+    batch = models.ForeignKey(
+        Batch, blank=True, null=True, on_delete=models.PROTECT, related_name="assets"
+    )
+
     errors = models.JSONField(blank=True, null=True)
 
+    # The validators that have finished, and the errors recorded so far, while
+    # the asset is in progress. See PIPELINE_CHECKPOINT.
+    checkpoint = models.JSONField(blank=True, null=True)
+
+    # The downscaled copy of an oversized image, written to
+    # PIPELINE_DERIVATIVES_DIR, for profiles that downscale.
+    derivative_path = models.TextField(blank=True, null=True)
+
+    # The run of the pipeline that started the asset, so that a redelivered
+    # `start_pipeline` can tell its own run from another one.
+    pipeline_run = models.UUIDField(blank=True, null=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Used to find stalled assets.
+            models.Index(fields=["state", "updated_at"]),
+            # Used to archive expired assets, oldest first.
+            models.Index(fields=["created_at", "id"]),
+        ]
+
+
+class ImageHash(models.Model):
+    """
+    Perceptual hash of an accepted asset, used to detect near-duplicates.
+
+    Hashes reference their asset by id, rather than a foreign key, so that
+    they're kept when the asset is archived, and re-submissions of archived
+    assets are still rejected.
+    """
+
+    asset_id = models.UUIDField(unique=True)
+    phash = models.BigIntegerField()
+
+
+class ProfileReport(models.Model):
+    """
+    A profile of one validator's run against an asset.
+
+    "cprofile" reports are pstats output, for assets flagged for profiling.
+    "sampled" reports hold the stacks sampled while a slow validator ran, in
+    the collapsed stack format flame graph tools read.
+    """
+
+    asset = models.ForeignKey(
+        Asset, on_delete=models.CASCADE, related_name="profile_reports"
+    )
+    validator = models.CharField(max_length=64)
+    kind = models.CharField(max_length=16, choices=PROFILE_KINDS)
+    duration_ms = models.FloatField()
+    stats = models.TextField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
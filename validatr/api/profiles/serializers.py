@@ -0,0 +1,59 @@
+from validatr.api.models import ValidationProfile
+
+from rest_framework import serializers
+
+# The image formats profiles can allow, as named by Pillow.
+IMAGE_FORMATS = ["BMP", "GIF", "JPEG", "JPEG2000", "PNG", "TIFF", "WEBP"]
+
+
+class ImageFormatField(serializers.ChoiceField):
+    """An image format, matched case insensitively."""
+
+    def __init__(self, **kwargs):
+        super().__init__(choices=IMAGE_FORMATS, **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = data.upper()
+
+        return super().to_internal_value(data)
+
+
+class ValidationProfileSerializer(serializers.ModelSerializer):
+    allowed_formats = serializers.ListField(
+        child=ImageFormatField(), allow_empty=False, required=False
+    )
+
+    class Meta:
+        model = ValidationProfile
+        fields = (
+            "name",
+            "version",
+            "allowed_formats",
+            "min_dimension",
+            "max_dimension",
+            "max_bytes",
+            "pixel_checks",
+            "downscale",
+        )
+
+    def validate(self, data):
+        # Partial updates are checked against the profile's current values.
+        dimensions = [
+            data.get(
+                name,
+                getattr(
+                    self.instance,
+                    name,
+                    ValidationProfile._meta.get_field(name).default,
+                ),
+            )
+            for name in ("min_dimension", "max_dimension")
+        ]
+        min_dimension, max_dimension = dimensions
+        if min_dimension > max_dimension:
+            raise serializers.ValidationError(
+                {"min_dimension": "Must be at most max_dimension."}
+            )
+
+        return data
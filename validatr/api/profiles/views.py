@@ -0,0 +1,17 @@
+from rest_framework import viewsets
+
+from validatr.api.models import ValidationProfile
+from validatr.api.profiles.serializers import ValidationProfileSerializer
+
+
+class ValidationProfileViewset(viewsets.ModelViewSet):
+    """
+    Create, list, fetch and update validation profiles, by name.
+
+    /api/profiles/{name}
+    """
+
+    queryset = ValidationProfile.objects.all()
+    serializer_class = ValidationProfileSerializer
+    lookup_field = "name"
+    http_method_names = ["get", "post", "put", "patch"]
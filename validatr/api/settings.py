@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 from pathlib import Path
 import environ
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,12 +25,38 @@ ENV = environ.Env(
         str,
         "django-insecure-v@^)i7b8cpi6qa+a%p-21&hc-ksi^suifrh5gs3h2-uvm76n#@",
     ),
+    # Database settings
+    DB_CONN_MAX_AGE=(int, 60),
+    DB_CONN_HEALTH_CHECKS=(bool, True),
+    DB_DISABLE_SERVER_SIDE_CURSORS=(bool, False),
     # Celery settings
     CELERY_BROKER_URL=(str, "redis://localhost:6379"),
     CELERY_RESULT_BACKEND=(str, "redis://localhost:6379"),
-    CELERY_ACCEPT_CONTENT=(list, ["application/json"]),
+    CELERY_ACCEPT_CONTENT=(list, ["application/json", "application/x-msgpack"]),
     CELERY_RESULT_SERIALIZER=(str, "json"),
     CELERY_TASK_SERIALIZER=(str, "json"),
+    CELERY_DB_REUSE_MAX=(int, 1000),
+    CELERY_WORKER_MAX_MEMORY_PER_CHILD=(int, 1048576),
+    CELERY_TASK_ACKS_LATE=(bool, False),
+    CELERY_TASK_REJECT_ON_WORKER_LOST=(bool, False),
+    # Pipeline settings
+    PIPELINE_MODE=(str, "chain"),
+    PIPELINE_FAIL_FAST=(bool, True),
+    PIPELINE_DEDUPE=(bool, False),
+    PIPELINE_DEDUPE_SNAPSHOT_DIR=(str, ""),
+    PIPELINE_DEEP_VERIFY=(bool, False),
+    PIPELINE_DECODE_PROCESSES=(int, 0),
+    PIPELINE_MAX_BYTES=(int, 104857600),
+    PIPELINE_MAX_PIXELS=(int, 50000000),
+    PIPELINE_MAX_DECODE_BYTES=(int, 268435456),
+    PIPELINE_PROFILE_SAMPLE_RATE=(float, 0.0),
+    PIPELINE_PROFILE_SLOW_MS=(int, 0),
+    PIPELINE_CHECKPOINT=(bool, False),
+    PIPELINE_STALL_SECONDS=(int, 900),
+    PIPELINE_DERIVATIVES_DIR=(str, f"{BASE_DIR.parent}/derivatives"),
+    ASSET_RETENTION_DAYS=(int, 0),
+    ASSET_ARCHIVE_DIR=(str, f"{BASE_DIR.parent}/archive"),
+    ASSET_ARCHIVE_CHUNK_SIZE=(int, 5000),
 )
 environ.Env.read_env(f"{BASE_DIR}/../.env")
 
@@ -96,6 +124,20 @@ DATABASES = {
     "default": ENV.db(),
 }
 
+# Keep connections open across HTTP requests and Celery tasks, instead of
+# opening a new one each time. Connections are checked before being reused,
+# and closed once they're older than DB_CONN_MAX_AGE seconds.
+#
+# Each API thread, and each prefork worker process, holds at most one
+# connection. To run more of them than Postgres allows connections, put
+# pgbouncer in front of it in transaction mode, and set
+# DB_DISABLE_SERVER_SIDE_CURSORS, as they don't survive across transactions.
+DATABASES["default"]["CONN_MAX_AGE"] = ENV("DB_CONN_MAX_AGE")
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = ENV("DB_CONN_HEALTH_CHECKS")
+DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = ENV(
+    "DB_DISABLE_SERVER_SIDE_CURSORS"
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -139,3 +181,134 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # APPEND_SLASH = False
+
+
+# Celery
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html
+
+CELERY_BROKER_URL = ENV("CELERY_BROKER_URL")
+
+# Leave CELERY_RESULT_BACKEND empty to run without a result backend. Chained
+# tasks hand their return value to the next task inside the message itself,
+# so only parallel mode, which joins its branches with a chord, needs one.
+CELERY_RESULT_BACKEND = ENV("CELERY_RESULT_BACKEND") or None
+
+# Set the serializers to "msgpack" for smaller messages and results. Workers
+# accept both formats by default, so the switch can be rolled out gradually.
+CELERY_ACCEPT_CONTENT = ENV("CELERY_ACCEPT_CONTENT")
+CELERY_RESULT_SERIALIZER = ENV("CELERY_RESULT_SERIALIZER")
+CELERY_TASK_SERIALIZER = ENV("CELERY_TASK_SERIALIZER")
+
+# By default, Celery's Django integration closes the db connection before and
+# after every task. Only force it closed every this many tasks, and otherwise
+# leave it to CONN_MAX_AGE.
+CELERY_DB_REUSE_MAX = ENV("CELERY_DB_REUSE_MAX")
+
+# Replace a prefork worker process once its resident memory passes this many
+# KiB. The process finishes its current task first, so nothing is lost. 0
+# never replaces them.
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = ENV("CELERY_WORKER_MAX_MEMORY_PER_CHILD") or None
+
+# Acknowledge task messages once they've run rather than when they're
+# received, so that the tasks of a worker that dies are redelivered to
+# another worker. Pipeline tasks are safe to run more than once.
+CELERY_TASK_ACKS_LATE = ENV("CELERY_TASK_ACKS_LATE")
+CELERY_TASK_REJECT_ON_WORKER_LOST = ENV("CELERY_TASK_REJECT_ON_WORKER_LOST")
+
+# Run with `celery -A validatr beat` to snapshot the near-duplicate index,
+# archive expired assets, and resume stalled pipelines if PIPELINE_CHECKPOINT
+# is on.
+CELERY_BEAT_SCHEDULE = {
+    "snapshot-hashes": {
+        "task": "validatr.pipeline.tasks.snapshot_hashes",
+        "schedule": 3600.0,
+    },
+    "archive-expired-assets": {
+        "task": "validatr.pipeline.tasks.archive_expired",
+        "schedule": 3600.0,
+    },
+}
+
+# The only modules workers import tasks from. Listing them explicitly, rather
+# than autodiscovering them, keeps the API (DRF, serializers, views) out of
+# worker processes.
+CELERY_IMPORTS = ["validatr.pipeline.tasks"]
+
+
+# Validation pipeline
+#
+# "chain" runs every validator as its own task, one after another.
+# "parallel" runs independent branches of validators concurrently.
+PIPELINE_MODE = ENV("PIPELINE_MODE")
+
+if PIPELINE_MODE == "parallel" and not CELERY_RESULT_BACKEND:
+    raise ImproperlyConfigured("PIPELINE_MODE=parallel requires CELERY_RESULT_BACKEND")
+
+# Skip validators whose dependencies have failed, rather than running every
+# validator against every asset.
+PIPELINE_FAIL_FAST = ENV("PIPELINE_FAIL_FAST")
+
+# Reject images that are near-duplicates of previously accepted assets.
+PIPELINE_DEDUPE = ENV("PIPELINE_DEDUPE")
+
+# Where the `snapshot_hashes` task saves its index of every accepted asset's
+# perceptual hash. Workers map the current snapshot read only, so all of the
+# processes on a host share one copy of it, and only index the hashes added
+# since it was taken themselves. Empty, every worker process indexes every
+# hash in the db itself.
+PIPELINE_DEDUPE_SNAPSHOT_DIR = ENV("PIPELINE_DEDUPE_SNAPSHOT_DIR")
+
+# Decode every pixel of each image, to catch corrupt image data that opening
+# the image and reading its header doesn't.
+PIPELINE_DEEP_VERIFY = ENV("PIPELINE_DEEP_VERIFY")
+
+# Run full decodes and pixel statistics in a pool of this many processes per
+# worker, rather than in the worker itself. Threaded and gevent workers hold
+# the GIL while decoding, so without a pool they decode one image at a time.
+# Prefork workers can't start a pool, and refuse to boot with one set. 0
+# decodes in the worker.
+PIPELINE_DECODE_PROCESSES = ENV("PIPELINE_DECODE_PROCESSES")
+
+# Resource budgets, applied to every asset whatever its profile, so that no
+# single image can exhaust a worker's memory. Files larger than
+# PIPELINE_MAX_BYTES are rejected before they're opened, and images with more
+# than PIPELINE_MAX_PIXELS pixels, or that would take more than
+# PIPELINE_MAX_DECODE_BYTES to decode at full size, are rejected from their
+# header, before any of their pixels are decoded.
+PIPELINE_MAX_BYTES = ENV("PIPELINE_MAX_BYTES")
+PIPELINE_MAX_PIXELS = ENV("PIPELINE_MAX_PIXELS")
+PIPELINE_MAX_DECODE_BYTES = ENV("PIPELINE_MAX_DECODE_BYTES")
+
+# Run every validator of this fraction of assets under cProfile, on top of
+# assets created with `"profiling": true`. Validators that run for longer than
+# PIPELINE_PROFILE_SLOW_MS have their stacks sampled until they finish. Both
+# store their reports on the asset. 0 disables them.
+PIPELINE_PROFILE_SAMPLE_RATE = ENV("PIPELINE_PROFILE_SAMPLE_RATE")
+PIPELINE_PROFILE_SLOW_MS = ENV("PIPELINE_PROFILE_SLOW_MS")
+
+# Save each asset's progress after every validator, in chain mode, so that a
+# pipeline whose worker died can be resumed from its last finished validator,
+# rather than from the start. Assets in progress that haven't made progress
+# for PIPELINE_STALL_SECONDS are resumed by the `reap_stalled` task. Without
+# checkpoints, an asset only makes progress when it starts and ends, so the
+# task isn't scheduled.
+PIPELINE_CHECKPOINT = ENV("PIPELINE_CHECKPOINT")
+PIPELINE_STALL_SECONDS = ENV("PIPELINE_STALL_SECONDS")
+
+if PIPELINE_CHECKPOINT and PIPELINE_MODE == "chain":
+    CELERY_BEAT_SCHEDULE["reap-stalled-assets"] = {
+        "task": "validatr.pipeline.tasks.reap_stalled",
+        "schedule": 60.0,
+    }
+
+# Where the downscaled copies of oversized images are written, for profiles
+# with `downscale` on. Derivatives are named after their asset's id.
+PIPELINE_DERIVATIVES_DIR = ENV("PIPELINE_DERIVATIVES_DIR")
+
+# Complete and failed assets older than ASSET_RETENTION_DAYS are moved out of
+# the db by the `archive_expired` task, into gzipped newline delimited JSON
+# files in ASSET_ARCHIVE_DIR, ASSET_ARCHIVE_CHUNK_SIZE assets at a time. 0
+# keeps assets forever.
+ASSET_RETENTION_DAYS = ENV("ASSET_RETENTION_DAYS")
+ASSET_ARCHIVE_DIR = ENV("ASSET_ARCHIVE_DIR")
+ASSET_ARCHIVE_CHUNK_SIZE = ENV("ASSET_ARCHIVE_CHUNK_SIZE")
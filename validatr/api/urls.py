@@ -2,9 +2,13 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from validatr.api.assets.views import AssetViewset, EchoViewset
+from validatr.api.batches.views import BatchViewset
+from validatr.api.profiles.views import ValidationProfileViewset
 
 router = DefaultRouter()
 router.register(r"assets", AssetViewset, basename="image")
+router.register(r"batches", BatchViewset, basename="batch")
+router.register(r"profiles", ValidationProfileViewset, basename="profile")
 router.register(r"echo", EchoViewset, basename="echo")
 
 urlpatterns = [
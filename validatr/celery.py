@@ -1,13 +1,24 @@
 import os
 import celery
 
+from validatr.pipeline import offload
+from validatr.utils import connections
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "validatr.api.settings")
 
+# Celery runs Django's system checks when a worker boots, which loads the whole
+# URLconf, and with it DRF and every view. The checks already run with the API
+# and `manage.py check`, so workers skip them. Tasks are loaded from the
+# modules listed in CELERY_IMPORTS instead.
+os.environ.setdefault("CELERY_SKIP_CHECKS", "true")
+
 
 celery_app = celery.Celery("validatr")
 
 celery_app.config_from_object(
     "django.conf:settings",
-    namespace="validatr",
-),
-celery_app.autodiscover_tasks()
+    namespace="CELERY",
+)
+
+connections.install()
+offload.install()
@@ -0,0 +1,132 @@
+import gzip
+import json
+import os
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from validatr.api.models import Asset, ImageHash, ProfileReport, COMPLETE, FAILED
+
+# The fields of each archived asset, with its webhook urls, profile name and
+# perceptual hash in place of the rows they're stored in.
+ARCHIVE_FIELDS = {
+    "id": "id",
+    "path": "path",
+    "provider": "provider",
+    "state": "state",
+    "errors": "errors",
+    "derivative_path": "derivative_path",
+    "profile": "profile__name",
+    "batch": "batch_id",
+    "start_webhook": "start_webhook__url",
+    "success_webhook": "success_webhook__url",
+    "failure_webhook": "failure_webhook__url",
+    "phash": "phash",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+
+
+def archive_assets(cutoff, output_dir=None, chunk_size=None):
+    """
+    Move every complete or failed asset created before `cutoff` out of the
+    db, into a gzipped file of newline delimited JSON, one asset per line.
+    Returns the number of assets archived, and the file's path.
+
+    Assets are archived oldest first, a chunk at a time, so the table is
+    never scanned or locked as a whole, and concurrent runs skip each other's
+    locked chunks. Each chunk is written as its own gzip member, and synced
+    to disk, before it's deleted, so no asset is deleted without being
+    archived. If the job dies part way, the rows of the chunk
+    it was on are still in the db, and are archived again by the next run.
+
+    Their profile reports and derivatives are deleted with them. Their
+    perceptual hashes are kept, so that re-submissions of archived assets are
+    still rejected as near-duplicates. The tables are vacuumed once the run
+    is done, since every chunk's deletes leave dead rows behind.
+    """
+    output_dir = output_dir or settings.ASSET_ARCHIVE_DIR
+    chunk_size = chunk_size or settings.ASSET_ARCHIVE_CHUNK_SIZE
+
+    expired = Asset.objects.filter(
+        state__in=[COMPLETE, FAILED], created_at__lt=cutoff
+    ).order_by("created_at", "id")
+    expired = expired.annotate(
+        phash=Subquery(
+            ImageHash.objects.filter(asset_id=OuterRef("id")).values("phash")[:1]
+        )
+    )
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(
+        output_dir,
+        f"assets-{cutoff:%Y%m%d}-{timezone.now():%Y%m%dT%H%M%S}.ndjson.gz",
+    )
+
+    archived = 0
+    with open(path, "ab") as f:
+        while True:
+            with transaction.atomic():
+                chunk = expired.select_for_update(skip_locked=True, of=("self",))
+                chunk = chunk.values_list(*ARCHIVE_FIELDS.values())[:chunk_size]
+                rows = [dict(zip(ARCHIVE_FIELDS, values)) for values in chunk]
+                if not rows:
+                    break
+
+                lines = "".join(
+                    json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in rows
+                )
+                f.write(gzip.compress(lines.encode()))
+                f.flush()
+                os.fsync(f.fileno())
+
+                Asset.objects.filter(id__in=[row["id"] for row in rows]).delete()
+
+            # Only once the chunk's deletes have committed, so a rolled back
+            # chunk never loses its derivatives.
+            for row in rows:
+                if row["derivative_path"]:
+                    try:
+                        os.remove(row["derivative_path"])
+                    except FileNotFoundError:
+                        pass
+
+            archived += len(rows)
+
+    if not archived:
+        os.remove(path)
+        return 0, None
+
+    vacuum_assets()
+    return archived, path
+
+
+def vacuum_assets():
+    """
+    Vacuum the assets table, and the tables its deletes cascade to, so the
+    space of the rows just archived is reused by new rows straight away,
+    rather than whenever autovacuum gets to them. Postgres only.
+    """
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        for model in [Asset, ProfileReport]:
+            cursor.execute(f'VACUUM (ANALYZE) "{model._meta.db_table}"')
+
+
+def archive_expired_assets():
+    """
+    Archive the assets that are older than `ASSET_RETENTION_DAYS`, if it's
+    set. Returns the number of assets archived, and the archive's path.
+    """
+    if not settings.ASSET_RETENTION_DAYS:
+        return 0, None
+
+    cutoff = timezone.now() - timedelta(days=settings.ASSET_RETENTION_DAYS)
+    return archive_assets(cutoff)
@@ -0,0 +1,384 @@
+import os
+import shutil
+import time
+
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+
+from django.conf import settings
+from PIL import Image
+
+from validatr.api.models import ImageHash
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+# Hashes are split into CHUNKS chunks of CHUNK_BITS bits each, and every chunk
+# gets its own lookup table (multi-index hashing). If two hashes are within
+# MAX_DISTANCE bits of each other, then by the pigeonhole principle at least
+# one of their chunks is within MAX_DISTANCE // CHUNKS bits, so only entries
+# close to the query on some chunk ever need to be compared in full.
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+KEY_DTYPE = np.uint16
+MAX_DISTANCE = 6
+
+# New hashes are kept in an unsorted buffer, which is scanned in full on every
+# lookup, and merged into the lookup tables once it grows past this size.
+MERGE_SIZE = 50000
+
+# The initial size of the pending buffer, which doubles whenever it fills up.
+PENDING_SIZE = 1024
+
+# The arrays an index is made of, as stored in a snapshot.
+SNAPSHOT_ARRAYS = ["hashes", "row_ids"] + [
+    f"{name}{chunk}" for name in ("keys", "order") for chunk in range(CHUNKS)
+]
+
+# How often a worker checks the db for hashes added by other workers.
+REFRESH_SECONDS = 5
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+DCT_MATRIX = _dct_matrix(DCT_SIZE)
+BIT_WEIGHTS = np.uint64(1) << np.arange(HASH_SIZE**2, dtype=np.uint64)
+
+
+def phash(path):
+    """
+    Compute the 64 bit perceptual hash of an image.
+
+    The image is decoded to a 32x32 grayscale thumbnail, and each bit of the
+    hash records whether one of its 64 lowest frequency DCT coefficients is
+    above the median. Re-encoding or resizing an image barely changes it.
+    """
+    with Image.open(path) as img:
+        img.draft("L", (DCT_SIZE, DCT_SIZE))
+        img = img.convert("L").resize((DCT_SIZE, DCT_SIZE), Image.BILINEAR)
+        pixels = np.asarray(img, dtype=np.float64)
+
+    coeffs = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE]
+    bits = (coeffs > np.median(coeffs.ravel()[1:])).ravel()
+
+    return int(BIT_WEIGHTS[bits].sum())
+
+
+def to_signed(value):
+    """Convert an unsigned 64 bit hash to the signed value stored in the db."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    """Convert a signed hash read from the db back to an unsigned 64 bit hash."""
+    return value + (1 << 64) if value < 0 else value
+
+
+class HashIndex:
+    """
+    In-memory index of perceptual hashes, supporting Hamming distance lookups.
+
+    Entries are identified by the id of their `ImageHash` row, and everything
+    is held in flat NumPy arrays: 40 bytes per hash, rather than a Python
+    object per asset. The asset a match belongs to is only looked up on a hit.
+    """
+
+    def __init__(self, hashes=None, row_ids=None, keys=None, order=None):
+        self.hashes = np.empty(0, dtype=np.uint64) if hashes is None else hashes
+        self.row_ids = np.empty(0, dtype=np.int64) if row_ids is None else row_ids
+        self.keys = keys or [np.empty(0, dtype=KEY_DTYPE)] * CHUNKS
+        self.order = order or [np.empty(0, dtype=np.uint32)] * CHUNKS
+
+        # Preallocated, so that lookups scan a slice of them, rather than
+        # converting a list to an array every time.
+        self.pending_hashes = np.empty(PENDING_SIZE, dtype=np.uint64)
+        self.pending_ids = np.empty(PENDING_SIZE, dtype=np.int64)
+        self.pending = 0
+
+    @classmethod
+    def build(cls, hashes, row_ids):
+        """Build an index over arrays of hashes and their row ids."""
+        index = cls(hashes, row_ids)
+        for chunk in range(CHUNKS):
+            keys = cls._chunk(hashes, chunk).astype(KEY_DTYPE)
+            index.order[chunk] = np.argsort(keys, kind="stable").astype(np.uint32)
+            index.keys[chunk] = keys[index.order[chunk]]
+
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """
+        Map a snapshot saved with `save` into memory. The mapping is read only,
+        so every process that loads the same snapshot shares its pages.
+        """
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in SNAPSHOT_ARRAYS
+        }
+        return cls(
+            arrays["hashes"],
+            arrays["row_ids"],
+            [arrays[f"keys{chunk}"] for chunk in range(CHUNKS)],
+            [arrays[f"order{chunk}"] for chunk in range(CHUNKS)],
+        )
+
+    def save(self, path):
+        """Write the index's lookup tables to a snapshot directory."""
+        self.merge()
+        os.makedirs(path)
+
+        arrays = {"hashes": self.hashes, "row_ids": self.row_ids}
+        for chunk in range(CHUNKS):
+            arrays[f"keys{chunk}"] = self.keys[chunk]
+            arrays[f"order{chunk}"] = self.order[chunk]
+
+        for name in SNAPSHOT_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), arrays[name])
+
+    def __len__(self):
+        return len(self.hashes) + self.pending
+
+    def add(self, value, row_id):
+        if self.pending == len(self.pending_hashes):
+            grow = len(self.pending_hashes)
+            self.pending_hashes = np.concatenate(
+                [self.pending_hashes, np.empty(grow, dtype=np.uint64)]
+            )
+            self.pending_ids = np.concatenate(
+                [self.pending_ids, np.empty(grow, dtype=np.int64)]
+            )
+
+        self.pending_hashes[self.pending] = value
+        self.pending_ids[self.pending] = row_id
+        self.pending += 1
+
+    def merge(self):
+        """
+        Merge the pending hashes into the sorted lookup tables. Only the
+        pending hashes are sorted, and then inserted in place, so a merge is
+        a copy of the tables rather than a sort of them.
+        """
+        if not self.pending:
+            return
+
+        hashes = self.pending_hashes[: self.pending].copy()
+        positions = np.arange(len(self.hashes), len(self.hashes) + len(hashes))
+
+        self.hashes = np.concatenate([self.hashes, hashes])
+        self.row_ids = np.concatenate([self.row_ids, self.pending_ids[: self.pending]])
+        self.pending_hashes = np.empty(PENDING_SIZE, dtype=np.uint64)
+        self.pending_ids = np.empty(PENDING_SIZE, dtype=np.int64)
+        self.pending = 0
+
+        for chunk in range(CHUNKS):
+            keys = self._chunk(hashes, chunk).astype(KEY_DTYPE)
+            order = np.argsort(keys, kind="stable")
+            keys = keys[order]
+
+            at = np.searchsorted(self.keys[chunk], keys, side="right")
+            self.keys[chunk] = np.insert(self.keys[chunk], at, keys)
+            self.order[chunk] = np.insert(
+                self.order[chunk], at, positions[order].astype(np.uint32)
+            )
+
+    def nearest(self, value, max_distance=MAX_DISTANCE):
+        """
+        Return `(row_id, distance)` of the closest indexed hash within
+        `max_distance` bits of `value`, or None.
+        """
+        query = np.uint64(value)
+        radius = max_distance // CHUNKS
+
+        candidates = []
+        for chunk in range(CHUNKS):
+            # Probe the table with the query's chunk, and with every value
+            # within `radius` bits of it.
+            probes = (self._chunk(query, chunk) ^ _flips(radius)).astype(KEY_DTYPE)
+            starts = np.searchsorted(self.keys[chunk], probes, side="left")
+            ends = np.searchsorted(self.keys[chunk], probes, side="right")
+            for start, end in zip(starts, ends):
+                if start != end:
+                    candidates.append(self.order[chunk][start:end])
+
+        best = None
+        if candidates:
+            idx = np.unique(np.concatenate(candidates))
+            distances = np.bitwise_count(self.hashes[idx] ^ query)
+            closest = np.argmin(distances)
+            if distances[closest] <= max_distance:
+                best = (int(self.row_ids[idx[closest]]), int(distances[closest]))
+
+        if self.pending:
+            distances = np.bitwise_count(self.pending_hashes[: self.pending] ^ query)
+            closest = np.argmin(distances)
+            if distances[closest] <= max_distance and (
+                best is None or distances[closest] < best[1]
+            ):
+                best = (int(self.pending_ids[closest]), int(distances[closest]))
+
+        return best
+
+    @staticmethod
+    def _chunk(values, chunk):
+        mask = np.uint64((1 << CHUNK_BITS) - 1)
+        return (values >> np.uint64(chunk * CHUNK_BITS)) & mask
+
+
+@lru_cache
+def _flips(radius):
+    """Every CHUNK_BITS bit mask with at most `radius` bits set."""
+    flips = [
+        sum(1 << bit for bit in bits)
+        for count in range(radius + 1)
+        for bits in combinations(range(CHUNK_BITS), count)
+    ]
+    return np.array(flips, dtype=np.uint64)
+
+
+def build_snapshot():
+    """
+    Build an index of every hash in the db, and save it as the current
+    snapshot in PIPELINE_DEDUPE_SNAPSHOT_DIR, for workers to map on their
+    next refresh. Returns the number of hashes in it.
+
+    Each snapshot is written to its own directory, which the `CURRENT` file
+    is then pointed at, so workers never see a partly written one. Snapshots
+    older than the previous one are removed, which doesn't affect workers
+    still mapping them.
+    """
+    root = settings.PIPELINE_DEDUPE_SNAPSHOT_DIR
+    previous = _current_snapshot()
+
+    rows = ImageHash.objects.order_by("id").values_list("id", "phash")
+    row_ids, values = [], []
+    for row_id, value in rows.iterator(chunk_size=MERGE_SIZE):
+        row_ids.append(row_id)
+        values.append(value)
+
+    # Hashes are stored signed, and reinterpreting them as unsigned is the
+    # same conversion as `to_unsigned`.
+    hashes = np.array(values, dtype=np.int64).view(np.uint64)
+    index = HashIndex.build(hashes, np.array(row_ids, dtype=np.int64))
+
+    name = f"snapshot-{row_ids[-1] if row_ids else 0}-{time.time_ns()}"
+    index.save(os.path.join(root, name))
+
+    tmp_path = os.path.join(root, "CURRENT.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(name)
+    os.replace(tmp_path, os.path.join(root, "CURRENT"))
+
+    for other in os.listdir(root):
+        if other.startswith("snapshot-") and other not in (name, previous):
+            shutil.rmtree(os.path.join(root, other), ignore_errors=True)
+
+    return len(index)
+
+
+def _current_snapshot():
+    """The name of the current snapshot, or None."""
+    root = settings.PIPELINE_DEDUPE_SNAPSHOT_DIR
+    if not root:
+        return None
+
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+# Each worker process maps the current snapshot, which its pages are shared
+# with every other process on the host, and keeps its own, much smaller,
+# index of the rows added since the snapshot was taken.
+_snapshot = HashIndex()
+_snapshot_name = None
+_index = HashIndex()
+_last_id = 0
+_last_refresh = 0.0
+
+# The ids of the rows this worker has indexed itself, since its last refresh,
+# so that it doesn't add them to its index a second time.
+_local_ids = set()
+
+
+def get_index():
+    """
+    Return this worker's snapshot and recent hash indexes, refreshed if they
+    are stale.
+    """
+    global _snapshot, _snapshot_name, _index, _last_id, _last_refresh, _local_ids
+
+    if time.monotonic() - _last_refresh < REFRESH_SECONDS:
+        return _snapshot, _index
+
+    name = _current_snapshot()
+    if name and name != _snapshot_name:
+        _snapshot = HashIndex.load(
+            os.path.join(settings.PIPELINE_DEDUPE_SNAPSHOT_DIR, name)
+        )
+        _snapshot_name = name
+        _index = HashIndex()
+        _local_ids = set()
+        _last_id = int(_snapshot.row_ids[-1]) if len(_snapshot.row_ids) else 0
+
+    rows = (
+        ImageHash.objects.filter(id__gt=_last_id)
+        .order_by("id")
+        .values_list("id", "phash")
+    )
+    for row_id, value in rows.iterator(chunk_size=MERGE_SIZE):
+        if row_id not in _local_ids:
+            _index.add(to_unsigned(value), row_id)
+        _last_id = row_id
+
+    # Every row this worker indexed itself is at or below `_last_id` now.
+    _local_ids = {row_id for row_id in _local_ids if row_id > _last_id}
+
+    if _index.pending >= MERGE_SIZE:
+        _index.merge()
+
+    _last_refresh = time.monotonic()
+    return _snapshot, _index
+
+
+def find_duplicate(value, max_distance=MAX_DISTANCE):
+    """
+    Return `(asset_id, distance)` of the closest accepted asset within
+    `max_distance` bits of the hash `value`, or None.
+    """
+    matches = [index.nearest(value, max_distance) for index in get_index()]
+    matches = [match for match in matches if match is not None]
+    if not matches:
+        return None
+
+    row_id, distance = min(matches, key=lambda match: match[1])
+
+    # Hashes are never deleted, even when their asset is archived, but the
+    # row may be missing in a db restored from an older backup.
+    asset_id = (
+        ImageHash.objects.filter(id=row_id).values_list("asset_id", flat=True).first()
+    )
+    if asset_id is None:
+        return None
+
+    return str(asset_id), distance
+
+
+def index_asset(asset_id, value):
+    """
+    Persist the hash of an accepted asset, and add it to this worker's index
+    straight away. Other workers pick it up on their next refresh.
+    """
+    row = ImageHash.objects.create(asset_id=asset_id, phash=to_signed(value))
+    _index.add(value, row.id)
+    _local_ids.add(row.id)
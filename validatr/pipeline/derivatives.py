@@ -0,0 +1,41 @@
+import os
+
+from PIL import Image
+
+# JPEG quality of derivatives.
+QUALITY = 90
+
+
+def fit_size(size, max_dimension):
+    """Scale a size down, keeping its aspect ratio, to fit `max_dimension`."""
+    scale = max_dimension / max(size)
+    return tuple(max(1, round(side * scale)) for side in size)
+
+
+def downscale(path, output_path, max_dimension, draft=True):
+    """
+    Write a JPEG copy of an image, scaled down to fit `max_dimension` on
+    both sides, and return its size.
+
+    JPEGs are decoded with `Image.draft`, which has the decoder scale them by
+    1/2, 1/4 or 1/8 as part of the DCT, to the smallest size that's still at
+    least the target size. That's a fraction of the time and memory of a full
+    size decode, and the rest of the way is a regular resample.
+    """
+    with Image.open(path) as img:
+        size = fit_size(img.size, max_dimension)
+        if draft:
+            img.draft("RGB", size)
+
+        img = img.convert("RGB")
+        img = img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    # Written to a temporary file first, so that a crash never leaves a
+    # partially written derivative behind at the final path.
+    tmp_path = f"{output_path}.tmp"
+    img.save(tmp_path, "JPEG", quality=QUALITY)
+    os.replace(tmp_path, output_path)
+
+    return img.size
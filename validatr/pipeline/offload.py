@@ -0,0 +1,122 @@
+import multiprocessing
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from celery import signals
+from django.conf import settings
+
+# Each worker process, or each worker thread's process in the threads and
+# gevent pools, keeps one pool of decode processes, started on first use.
+_pool = None
+_pool_lock = threading.Lock()
+
+# Prefork worker processes are daemonic, and can't start a decode pool.
+PREFORK_ERROR = (
+    "PIPELINE_DECODE_PROCESSES can't be used in the prefork pool, run workers "
+    "with `-P threads` or `-P gevent`, or set it to 0"
+)
+
+
+class DecodePoolError(RuntimeError):
+    """
+    The decode pool couldn't be started. This is a problem with the worker,
+    not the image, so it's raised rather than recorded as a validation error.
+    """
+
+
+def _warm(max_pixels=None):
+    """
+    Import the decoders ahead of the first job, and apply the worker's pixel
+    limit, in each pool process.
+    """
+    from PIL import Image
+
+    import validatr.pipeline.pixels  # noqa: F401
+
+    if max_pixels is not None:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+def get_pool():
+    """
+    Return this process's decode pool, starting it and all of its processes
+    the first time it's needed.
+
+    Prefork worker processes are daemonic, and daemonic processes can't start
+    children, so the pool is only available in the threads, gevent and solo
+    Celery pools. Prefork workers already decode in parallel, one image per
+    process.
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            return _pool
+
+        if multiprocessing.current_process().daemon:
+            raise DecodePoolError(PREFORK_ERROR)
+
+        processes = settings.PIPELINE_DECODE_PROCESSES
+        # Pool processes are spawned rather than forked, so they don't
+        # inherit the worker's db connections or broker sockets.
+        pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm,
+            initargs=(settings.PIPELINE_MAX_PIXELS,),
+        )
+        try:
+            for future in [pool.submit(_warm) for _ in range(processes)]:
+                future.result()
+        except Exception as exc:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise DecodePoolError(f"The decode pool failed to start: {exc!r}") from exc
+
+        _pool = pool
+        return _pool
+
+
+def check_worker_pool(sender, **kwargs):
+    """
+    Refuse to boot a prefork worker with `PIPELINE_DECODE_PROCESSES` set,
+    rather than have every task that decodes fail. Connected to Celery's
+    `worker_init` signal, whose handlers' exceptions are only logged, so the
+    worker is stopped with `SystemExit`.
+    """
+    from celery.concurrency import get_implementation
+
+    pool = get_implementation(sender.pool_cls)
+    if settings.PIPELINE_DECODE_PROCESSES and pool.__module__.endswith(".prefork"):
+        raise SystemExit(PREFORK_ERROR)
+
+
+def install():
+    """Check the worker's pool is compatible with the decode pool on boot."""
+    signals.worker_init.connect(check_worker_pool)
+
+
+def offload(func, *args):
+    """
+    Run `func(*args)` in the decode pool, and return its result.
+
+    Only picklable arguments, like file paths, cross the process boundary;
+    images are read from disk by the pool process. When
+    `PIPELINE_DECODE_PROCESSES` is 0, `func` runs in this process instead.
+    """
+    global _pool
+
+    if not settings.PIPELINE_DECODE_PROCESSES:
+        return func(*args)
+
+    pool = get_pool()
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool:
+        # A pool process died, most likely killed while decoding. Start a
+        # new pool for the next job.
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
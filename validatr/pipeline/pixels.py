@@ -0,0 +1,93 @@
+import threading
+
+from contextlib import contextmanager
+
+import numpy as np
+
+from PIL import Image, ImageFile
+
+# Images are decoded to grayscale, no larger than this on their longest side.
+# JPEGs are scaled down during the DCT decode via `Image.draft`, which is much
+# cheaper than decoding at full size and resizing afterwards.
+SAMPLE_SIZE = 256
+
+TRUNCATED_GRAY = 128
+
+_truncated_lock = threading.Lock()
+
+
+@contextmanager
+def truncated_images(allowed):
+    """
+    Set whether Pillow decodes truncated and corrupt image data, rather than
+    raising, for the duration of a decode. The setting is process wide, so
+    decodes that depend on it never run concurrently within a process.
+    """
+    with _truncated_lock:
+        previous = ImageFile.LOAD_TRUNCATED_IMAGES
+        ImageFile.LOAD_TRUNCATED_IMAGES = allowed
+        try:
+            yield
+        finally:
+            ImageFile.LOAD_TRUNCATED_IMAGES = previous
+
+
+def load_pixels(path, sample_size=SAMPLE_SIZE):
+    """
+    Decode an image once into a downscaled grayscale array.
+
+    Truncated files are decoded instead of raising, so that how much of the
+    image is missing can be measured. Missing JPEG rows are decoded as flat
+    mid-gray.
+    """
+    with Image.open(path) as img, truncated_images(True):
+        img.draft("L", (sample_size, sample_size))
+        img = img.convert("L")
+        img.thumbnail((sample_size, sample_size))
+        return np.asarray(img)
+
+
+def pixel_stats(pixels):
+    """
+    Compute the statistics used by the pixel quality checks, in a handful of
+    vectorized passes over the array.
+    """
+    hist = np.bincount(pixels.ravel(), minlength=256)
+    total = hist.sum()
+
+    levels = np.arange(256)
+    mean = (hist * levels).sum() / total
+    stddev = np.sqrt((hist * (levels - mean) ** 2).sum() / total)
+
+    probs = hist[hist > 0] / total
+    entropy = -(probs * np.log2(probs)).sum()
+
+    # A truncated JPEG decodes as the intact rows, followed by rows of flat
+    # gray. Count how many of the trailing rows look like that padding.
+    gray_rows = (np.abs(pixels.astype(np.int16) - TRUNCATED_GRAY) <= 1).all(axis=1)
+    padded_rows = len(gray_rows) if gray_rows.all() else np.argmin(gray_rows[::-1])
+
+    return {
+        "mean": float(mean),
+        "stddev": float(stddev),
+        "entropy": float(entropy),
+        "truncated": float(padded_rows / len(gray_rows)),
+    }
+
+
+def measure_pixels(path, sample_size=SAMPLE_SIZE):
+    """
+    Decode an image and compute its pixel statistics. Only the small stats
+    dict is returned, so it's cheap to run in the decode pool.
+    """
+    return pixel_stats(load_pixels(path, sample_size))
+
+
+def decode_image(path):
+    """
+    Decode every pixel of an image at full size, raising if its data is
+    corrupt. Returns the decoded image's size.
+    """
+    with Image.open(path) as img, truncated_images(False):
+        img.load()
+        return img.size
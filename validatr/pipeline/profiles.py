@@ -0,0 +1,58 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from validatr.api.models import ValidationProfile
+
+# The compiled, immutable form of a validation profile.
+RulePlan = namedtuple(
+    "RulePlan",
+    [
+        "formats",
+        "min_dimension",
+        "max_dimension",
+        "max_bytes",
+        "pixel_checks",
+        "downscale",
+    ],
+)
+
+# The rules for assets created without a profile.
+DEFAULT_RULES = RulePlan(
+    formats=("JPEG",),
+    min_dimension=0,
+    max_dimension=1000,
+    max_bytes=None,
+    pixel_checks=False,
+    downscale=False,
+)
+
+
+def compile_profile(profile):
+    """Compile a validation profile into a rule plan."""
+    return RulePlan(
+        formats=tuple(sorted(fmt.upper() for fmt in profile.allowed_formats)),
+        min_dimension=profile.min_dimension,
+        max_dimension=profile.max_dimension,
+        max_bytes=profile.max_bytes,
+        pixel_checks=profile.pixel_checks,
+        downscale=profile.downscale,
+    )
+
+
+@lru_cache(maxsize=256)
+def load_rules(profile_id, version):
+    """
+    Load and compile a profile, once per worker for each version of it.
+
+    Editing a profile bumps its version, and new snapshots reference the new
+    version, so workers pick up the change without being restarted.
+    """
+    return compile_profile(ValidationProfile.objects.get(id=profile_id))
+
+
+def get_rules(snapshot):
+    """Return the rule plan to validate the snapshot's asset against."""
+    if not snapshot.get("profile"):
+        return DEFAULT_RULES
+
+    return load_rules(*snapshot["profile"])
@@ -0,0 +1,149 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from validatr.api.models import ProfileReport, CPROFILE, SAMPLED
+
+# How many functions a cProfile report lists, by cumulative time.
+REPORT_FUNCTIONS = 40
+
+# How often the watchdog samples the stacks of slow checks, in seconds, and
+# how many of the innermost frames of each stack it keeps.
+SAMPLE_INTERVAL = 0.005
+SAMPLE_DEPTH = 30
+
+# The checks running in this process, by thread id, that the watchdog samples
+# once they've been running for longer than PIPELINE_PROFILE_SLOW_MS.
+_running = {}
+_running_lock = threading.Lock()
+_watchdog = None
+_watchdog_lock = threading.Lock()
+
+
+class _Running:
+    def __init__(self, start):
+        self.start = start
+        self.samples = Counter()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+
+def _stack(frame):
+    """The innermost frames of a stack, outermost first."""
+    names = []
+    while frame is not None and len(names) < SAMPLE_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+
+    return tuple(reversed(names))
+
+
+def _watch(threshold):
+    while True:
+        time.sleep(SAMPLE_INTERVAL)
+        if not _running:
+            continue
+
+        now = time.monotonic()
+        frames = sys._current_frames()
+        with _running_lock:
+            for thread_id, running in _running.items():
+                frame = frames.get(thread_id)
+                if frame is not None and now - running.start >= threshold:
+                    running.samples[_stack(frame)] += 1
+
+
+def _start_watchdog():
+    global _watchdog
+
+    with _watchdog_lock:
+        if _watchdog is None:
+            threshold = settings.PIPELINE_PROFILE_SLOW_MS / 1000
+            _watchdog = threading.Thread(
+                target=_watch, args=(threshold,), name="profile-watchdog", daemon=True
+            )
+            _watchdog.start()
+
+
+def format_cprofile(profiler):
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats("cumulative").print_stats(REPORT_FUNCTIONS)
+    return out.getvalue()
+
+
+def format_samples(samples):
+    """Samples in the collapsed stack format flame graph tools read."""
+    return "\n".join(
+        f"{';'.join(stack)} {count}" for stack, count in samples.most_common()
+    )
+
+
+@contextmanager
+def profile_check(snapshot, name):
+    """
+    Profile a check, if its asset was flagged for profiling, or sample its
+    stack if it runs for longer than PIPELINE_PROFILE_SLOW_MS. Any profile
+    captured is stored as a report on the asset.
+
+    With neither enabled, this costs a dict lookup and reading a setting.
+    """
+    if snapshot.get("profiling"):
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Only one profiler can be active at a time on Python 3.12+, so
+            # concurrent checks in a threaded worker run unprofiled.
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            profiler.disable()
+            ProfileReport.objects.create(
+                asset_id=snapshot["id"],
+                validator=name,
+                kind=CPROFILE,
+                duration_ms=(time.perf_counter() - start) * 1000,
+                stats=format_cprofile(profiler),
+            )
+
+    elif settings.PIPELINE_PROFILE_SLOW_MS:
+        _start_watchdog()
+
+        thread_id = threading.get_ident()
+        running = _Running(time.monotonic())
+        with _running_lock:
+            _running[thread_id] = running
+        try:
+            yield
+        finally:
+            with _running_lock:
+                del _running[thread_id]
+
+            # Samples are only taken once the check is over the threshold.
+            if running.samples:
+                ProfileReport.objects.create(
+                    asset_id=snapshot["id"],
+                    validator=name,
+                    kind=SAMPLED,
+                    duration_ms=(time.monotonic() - running.start) * 1000,
+                    stats=format_samples(running.samples),
+                )
+
+    else:
+        yield
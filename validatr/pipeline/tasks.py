@@ -1,222 +1,904 @@
 import os
+import random
+import uuid
 
-import validators
+from datetime import timedelta
 
-from celery import chain, shared_task
+from concurrent.futures.process import BrokenProcessPool
+
+from celery import chain, group, shared_task
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
 from PIL import Image, UnidentifiedImageError
 
+from validatr.pipeline.archive import archive_expired_assets
+from validatr.pipeline.offload import DecodePoolError, offload
+from validatr.pipeline.profiles import get_rules
+from validatr.pipeline.profiling import profile_check
+from validatr.utils.connections import count_asset
 from validatr.utils.webhooks import webhook_post
-from validatr.api.models import Asset, IN_PROGRESS, COMPLETE, FAILED
-from validatr.api.assets.serializers import (
-    GetAssetResponseSerializer,
-    GetAssetWithErrorsResponseSerializer,
+from validatr.api.models import (
+    Asset,
+    Batch,
+    WebhookEndpoint,
+    QUEUED,
+    IN_PROGRESS,
+    COMPLETE,
+    FAILED,
 )
 
-
 ON_START = "onStart"
 ON_SUCCESS = "onSuccess"
 ON_FAILURE = "onFailure"
 
+# Pillow refuses to open images with more than twice this many pixels. The
+# pipeline rejects them from their header first, but this is a backstop for
+# any decode that runs when that check hasn't, or has failed.
+Image.MAX_IMAGE_PIXELS = settings.PIPELINE_MAX_PIXELS
 
-@shared_task
-def record_errors(asset_id, errors, caller=None):
+# The states an asset moves from and to when each hook is triggered.
+TRANSITIONS = {
+    ON_START: (QUEUED, IN_PROGRESS),
+    ON_SUCCESS: (IN_PROGRESS, COMPLETE),
+    ON_FAILURE: (IN_PROGRESS, FAILED),
+}
+
+# Pipeline execution modes, selected with the `PIPELINE_MODE` setting.
+PIPELINE_CHAIN = "chain"
+PIPELINE_PARALLEL = "parallel"
+
+# Bump this whenever the shape of the asset snapshot changes, so that workers
+# can tell apart payloads enqueued by an older version of the pipeline.
+SNAPSHOT_VERSION = 3
+
+
+def snapshot_asset(asset):
     """
-    When called, will record the errors into the asset record.
+    Build the compact asset snapshot that is passed between pipeline tasks,
+    so that validators don't need to go back to the db.
     """
+    return {
+        "v": SNAPSHOT_VERSION,
+        "id": str(asset.id),
+        "path": asset.path,
+        "provider": asset.provider,
+        "profile": (
+            [asset.profile_id, asset.profile.version] if asset.profile_id else None
+        ),
+        # Webhook endpoint ids, which workers resolve from their local cache.
+        "hooks": {
+            ON_START: asset.start_webhook_id,
+            ON_SUCCESS: asset.success_webhook_id,
+            ON_FAILURE: asset.failure_webhook_id,
+        },
+        "batch": str(asset.batch_id) if asset.batch_id else None,
+        "errors": asset.errors or {},
+    }
+
+
+def load_snapshot(payload):
+    """
+    Return the asset snapshot carried by a pipeline payload.
 
-    print(f"record_errors: asset_id: {asset_id} errors: {errors} caller: {caller}")
+    Payloads from before snapshots were introduced carry a bare asset id, in
+    which case the snapshot is built from the db. Version 1 snapshots carry
+    webhook urls, rather than endpoint ids, and versions 1 and 2 don't carry
+    the asset's batch.
+    """
+    if not isinstance(payload, dict):
+        return snapshot_asset(Asset.objects.get(id=payload))
 
-    # Set the failed state, along with error messages on the asset record.
-    asset = Asset.objects.get(id=asset_id)
+    if payload.get("v") == 1:
+        payload["v"] = 2
+        payload["hooks"] = {
+            hook_name: None if url is None else WebhookEndpoint.objects.register(url).id
+            for hook_name, url in payload["hooks"].items()
+        }
 
-    # If no errors are recorded yet, then we can just set the errors.
-    if asset.errors is None:
-        asset.errors = errors
-    else:
-        prev_errors = asset.errors.copy()
-        # If errors are already recorded, then we need to merge the new errors
-        for key, value in errors.items():
-            if key not in prev_errors:
-                prev_errors[key] = value
-            else:
-                prev_errors[key].extend(value)
+    if payload.get("v") == 2:
+        payload["v"] = SNAPSHOT_VERSION
+        payload["batch"] = None
 
-    asset.save()
+    if payload.get("v") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported asset snapshot version: {payload.get('v')}")
 
+    return payload
 
-def run_pipeline(asset_id):
+
+def record_errors(snapshot, errors, caller=None):
     """
-    Kicks off the asynchronous validation pipeline for a given asset.
+    When called, will merge the errors into the asset snapshot.
+    """
+
+    print(
+        f"record_errors: asset_id: {snapshot['id']} errors: {errors} caller: {caller}"
+    )
+
+    # Messages already recorded are skipped, so a validator that is retried
+    # or resumed doesn't report the same error twice.
+    for key, value in errors.items():
+        recorded = snapshot["errors"].setdefault(key, [])
+        recorded.extend(message for message in value if message not in recorded)
+
+
+def run_pipeline(asset, profiling=False):
+    """
+    Kicks off the asynchronous validation pipeline for a given asset. With
+    `profiling`, every validator is run under cProfile.
     """
 
     # The pipeline is an ordered chain of validation asynchronous tasks.
     #
-    # If a task succeeds in validation, then the `asset_id` is returned and
-    # passed to the next step in the pipeline.
+    # A snapshot of the asset is passed from each task to the next, so that
+    # the db is only touched when the pipeline starts and ends.
     #
-    # If a task fails in validation, the error is recorded to the db record.
+    # If a task fails in validation, the error is recorded to the snapshot.
     # When all of the pipeline tasks have finished, the `end_pipeline` task will
-    # notify the onFailure webhook endpoint.
+    # save the errors and notify the onFailure webhook endpoint.
+    #
+    # In parallel mode, independent branches of validators run concurrently as
+    # a group, and `end_pipeline` is called once every branch has finished.
+    snapshot = snapshot_asset(asset)
+    if profiling:
+        snapshot["profiling"] = True
+
+    return launch_pipeline(snapshot)
+
+
+def launch_pipeline(snapshot):
+    """
+    Kicks off the validation pipeline for an asset snapshot.
+    """
+    names = enabled_validators(get_rules(snapshot))
+
+    # Each launch is its own run of the pipeline, which `start_pipeline`
+    # records on the asset. Older workers ignore it, like the profiling flag.
+    snapshot["run"] = str(uuid.uuid4())
+
+    # Older workers ignore the flag, so adding it doesn't change the snapshot
+    # version.
+    rate = settings.PIPELINE_PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        snapshot["profiling"] = True
+
+    if settings.PIPELINE_MODE == PIPELINE_PARALLEL:
+        branches = [
+            [name for name in branch if name in names] for branch in PARALLEL_BRANCHES
+        ]
+        pipeline = [
+            start_pipeline.s(snapshot),
+            group(validate_branch.s(branch) for branch in branches if branch),
+            end_pipeline.s(),
+        ]
+        return chain(pipeline).apply_async()
+
     pipeline = [
-        start_pipeline.s(asset_id),
-        validate_webhook_urls.s(),
-        validate_asset_path.s(),
-        validate_asset_is_image.s(),
-        validate_asset_is_jpeg.s(),
-        validate_asset_dimensions.s(),
+        start_pipeline.s(snapshot),
+        *(VALIDATOR_TASKS[name].s() for name in names),
         end_pipeline.s(),
     ]
     return chain(pipeline).apply_async()
 
 
-def trigger_hook(asset_id, hook_name):
+@shared_task(ignore_result=True)
+def start_pipelines(snapshots):
+    """
+    Kicks off the validation pipeline for a batch of assets, so that bulk
+    ingests send one message per batch rather than one per asset.
+    """
+    for snapshot in snapshots:
+        launch_pipeline(load_snapshot(snapshot))
+
+
+def resume_pipeline(asset):
+    """
+    Relaunch a stalled pipeline from its last checkpoint, running only the
+    validators that hadn't finished, and those that didn't run because they
+    were skipped. The asset is already in progress, so `start_pipeline` isn't
+    run again.
+    """
+    snapshot = snapshot_asset(asset)
+    snapshot.update(asset.checkpoint or {})
+
+    skipped = set(snapshot.get("done", []))
+    if settings.PIPELINE_FAIL_FAST:
+        for name in snapshot.get("failed", []):
+            skipped |= dependents(name)
+
+    tasks = [
+        VALIDATOR_TASKS[name]
+        for name in enabled_validators(get_rules(snapshot))
+        if name not in skipped
+    ]
+    tasks.append(end_pipeline)
+
+    pipeline = [tasks[0].s(snapshot), *(task.s() for task in tasks[1:])]
+    return chain(pipeline).apply_async()
+
+
+def reap_stalled_assets(stalled_seconds=None):
+    """
+    Resume every in progress asset that hasn't made progress for
+    `PIPELINE_STALL_SECONDS`, most likely because the worker running it died.
+    Returns the number of assets resumed.
+
+    Only assets with checkpoints make progress between validators, so nothing
+    is resumed unless `PIPELINE_CHECKPOINT` is on, in chain mode. Each resumed
+    asset's attempt is bumped, so that the chain it's resumed from exits at
+    its next checkpoint if it turns out to still be running, or queued.
+    """
+    if not settings.PIPELINE_CHECKPOINT or settings.PIPELINE_MODE != PIPELINE_CHAIN:
+        return 0
+
+    if stalled_seconds is None:
+        stalled_seconds = settings.PIPELINE_STALL_SECONDS
+
+    cutoff = timezone.now() - timedelta(seconds=stalled_seconds)
+    stalled = Asset.objects.filter(state=IN_PROGRESS, updated_at__lt=cutoff)
+
+    resumed = 0
+    for asset in stalled.select_related("profile").iterator():
+        # Claim the asset first, so that reapers running at the same time
+        # don't both resume it.
+        checkpoint = asset.checkpoint or {}
+        checkpoint = {**checkpoint, "attempt": checkpoint.get("attempt", 0) + 1}
+
+        claimed = Asset.objects.filter(id=asset.id, updated_at=asset.updated_at)
+        if claimed.update(checkpoint=checkpoint, updated_at=timezone.now()):
+            asset.checkpoint = checkpoint
+            resume_pipeline(asset)
+            resumed += 1
+
+    return resumed
+
+
+@shared_task(ignore_result=True)
+def reap_stalled():
+    resumed = reap_stalled_assets()
+    print(f"Resumed stalled assets: count:{resumed}")
+
+
+@shared_task(ignore_result=True)
+def archive_expired():
+    archived, path = archive_expired_assets()
+    print(f"Archived expired assets: count:{archived} path:{path}")
+
+
+@shared_task(ignore_result=True)
+def snapshot_hashes():
+    if not settings.PIPELINE_DEDUPE or not settings.PIPELINE_DEDUPE_SNAPSHOT_DIR:
+        return
+
+    from validatr.pipeline.dedupe import build_snapshot
+
+    count = build_snapshot()
+    print(f"Snapshotted perceptual hashes: count:{count}")
+
+
+def get_hook(snapshot, hook_name):
+    """Return the snapshot's webhook endpoint for a hook, or None."""
+    endpoint_id = snapshot["hooks"][hook_name]
+    if endpoint_id is None:
+        return None
+
+    return WebhookEndpoint.objects.get_cached(endpoint_id)
+
+
+def trigger_hook(snapshot, hook_name):
     """
     Update the asset record with the new state, then send the webhook notification.
+
+    Returns True if the asset was moved to the new state, and False if it
+    wasn't in the state the hook moves it from.
     """
-    asset = Asset.objects.get(id=asset_id)
+    asset_id = snapshot["id"]
+    endpoint = get_hook(snapshot, hook_name)
+    url = endpoint.url if endpoint else None
+
+    # The update is a single query, and the webhook payloads are built from the
+    # snapshot, as the asset record itself is never loaded. Updates only match
+    # assets in the state the hook moves them from, so that a redelivered or
+    # stale task never moves an asset twice, or counts it twice in its batch.
+    from_state, to_state = TRANSITIONS[hook_name]
+    asset = Asset.objects.filter(id=asset_id, state=from_state)
 
     if hook_name == ON_START:
-        asset.state = IN_PROGRESS
-        asset.save()
+        moved = asset.update(
+            state=IN_PROGRESS,
+            pipeline_run=snapshot.get("run"),
+            updated_at=timezone.now(),
+        )
 
-        payload = GetAssetResponseSerializer(asset).data
+        payload = {"id": asset_id, "state": IN_PROGRESS}
 
-        print(
-            f"Asset Validation Started: id:{asset.id} notify:{asset.start_webhook_endpoint} payload:{payload}"
-        )
-        if validators.url(asset.start_webhook_endpoint):
-            webhook_post(asset.start_webhook_endpoint, payload)
+        print(f"Asset Validation Started: id:{asset_id} notify:{url} payload:{payload}")
 
     elif hook_name == ON_SUCCESS:
-        asset.state = COMPLETE
-        asset.save()
+        moved = asset.update(
+            state=COMPLETE,
+            derivative_path=snapshot.get("derivative"),
+            checkpoint=None,
+            updated_at=timezone.now(),
+        )
 
-        payload = GetAssetResponseSerializer(asset).data
+        payload = {"id": asset_id, "state": COMPLETE}
+        if "derivative" in snapshot:
+            payload["derivativePath"] = snapshot["derivative"]
 
         print(
-            f"Asset Validation Complete: id:{asset.id} notify:{asset.success_webhook_endpoint} payload:{payload}"
+            f"Asset Validation Complete: id:{asset_id} notify:{url} payload:{payload}"
         )
 
-        if validators.url(asset.success_webhook_endpoint):
-            webhook_post(asset.success_webhook_endpoint, payload)
-
     elif hook_name == ON_FAILURE:
-        asset.state = FAILED
-        asset.save()
+        moved = asset.update(
+            state=FAILED,
+            errors=snapshot["errors"],
+            checkpoint=None,
+            updated_at=timezone.now(),
+        )
 
-        payload = GetAssetWithErrorsResponseSerializer(asset).data
+        payload = {"id": asset_id, "state": FAILED, "errors": snapshot["errors"]}
 
-        print(
-            f"Asset Validation Failed: id:{asset.id} notify:{asset.failure_webhook_endpoint} payload:{payload}"
-        )
-        if validators.url(asset.failure_webhook_endpoint):
-            webhook_post(asset.failure_webhook_endpoint, payload)
+        print(f"Asset Validation Failed: id:{asset_id} notify:{url} payload:{payload}")
 
+    moved = bool(moved)
 
-@shared_task
-def start_pipeline(asset_id):
-    trigger_hook(asset_id, ON_START)
-    return asset_id
+    # A task that's redelivered after a crash finds the asset already in the
+    # new state, and sends its webhook again, with the same idempotency key,
+    # as the crash may have happened before it was sent. An asset that's in
+    # any other state has been moved on by another run of the pipeline, which
+    # owns its notifications, as has an asset that another run started.
+    current = Asset.objects.filter(id=asset_id, state=to_state)
+    if hook_name == ON_START and "run" in snapshot:
+        current = current.filter(pipeline_run=snapshot["run"])
 
+    if not moved and not current.exists():
+        print(f"Asset Transition Skipped: id:{asset_id} hook:{hook_name}")
+        return False
 
-@shared_task
-def end_pipeline(asset_id):
-    asset = Asset.objects.get(id=asset_id)
-    if asset.errors:
-        return trigger_hook(asset.id, ON_FAILURE)
+    # Endpoints are validated once, when they're first registered.
+    if endpoint and endpoint.is_valid:
+        webhook_post(url, payload, idempotency_key=f"{asset_id}:{payload['state']}")
 
-    trigger_hook(asset.id, ON_SUCCESS)
-    return asset.id
+    batch_id = snapshot["batch"]
+    if moved and batch_id:
+        Batch.objects.transition(batch_id, from_state, to_state)
+        if hook_name != ON_START and Batch.objects.finish(batch_id):
+            notify_batch.delay(batch_id)
 
+    return moved
 
-@shared_task(bind=True)
-def validate_webhook_urls(self, asset_id):
-    """Check that the webhook urls are valid."""
-    asset = Asset.objects.get(id=asset_id)
 
+@shared_task(ignore_result=True)
+def notify_batch(batch_id):
+    """Send a batch's completion webhook notification."""
+    batch = Batch.objects.get(id=batch_id)
+    url = batch.complete_webhook_endpoint
+
+    payload = {
+        "id": str(batch.id),
+        "state": COMPLETE,
+        "total": batch.total,
+        "complete": batch.complete,
+        "failed": batch.failed,
+    }
+
+    print(f"Batch Validation Complete: id:{batch.id} notify:{url} payload:{payload}")
+
+    if batch.complete_webhook and batch.complete_webhook.is_valid:
+        webhook_post(url, payload, idempotency_key=f"batch:{batch.id}")
+
+
+# Nothing reads the results of chained tasks, as each task's return value is
+# passed on to the next task in the message itself. Only `validate_branch`,
+# which is joined by a chord in parallel mode, needs its result stored.
+@shared_task(bind=True, ignore_result=True)
+def start_pipeline(self, payload):
+    snapshot = load_snapshot(payload)
+
+    # An asset that isn't queued has already been started. If this run started
+    # it, this task was redelivered after a crash, and the pipeline carries
+    # on. Otherwise another run started it, such as when the asset was
+    # enqueued twice, and the rest of this one is dropped.
+    if not trigger_hook(snapshot, ON_START) and not is_own_run(snapshot):
+        self.request.chain = None
+
+    return snapshot
+
+
+def is_own_run(snapshot):
+    """Whether the snapshot's run of the pipeline is the one that started it."""
+    if "run" not in snapshot:
+        return False
+
+    return Asset.objects.filter(
+        id=snapshot["id"], state=IN_PROGRESS, pipeline_run=snapshot["run"]
+    ).exists()
+
+
+@shared_task(ignore_result=True)
+def end_pipeline(payload):
+    # When joining a group of branches, every branch returns its own snapshot,
+    # holding the errors recorded by that branch.
+    if isinstance(payload, list):
+        snapshot = load_snapshot(payload[0])
+        for branch in map(load_snapshot, payload[1:]):
+            record_errors(snapshot, branch["errors"], caller="end_pipeline")
+            for key in ("phash", "derivative"):
+                if key in branch:
+                    snapshot[key] = branch[key]
+    else:
+        snapshot = load_snapshot(payload)
+
+    if snapshot["errors"]:
+        moved = trigger_hook(snapshot, ON_FAILURE)
+
+        # Rejected assets don't keep their derivative.
+        if moved and "derivative" in snapshot:
+            try:
+                os.remove(snapshot["derivative"])
+            except FileNotFoundError:
+                pass
+    else:
+        moved = trigger_hook(snapshot, ON_SUCCESS)
+
+        # Only accepted assets are indexed, for later near-duplicate checks.
+        if moved and "phash" in snapshot:
+            from validatr.pipeline.dedupe import index_asset
+
+            index_asset(snapshot["id"], snapshot["phash"])
+
+    count_asset()
+
+    return snapshot["id"]
+
+
+def check_webhook_urls(snapshot, rules):
+    """Check that the webhook urls are valid."""
     ERR_MSG = "`{}`is not a valid URL"
 
     errors = {}
-    if not validators.url(asset.start_webhook_endpoint):
-        errors[ON_START] = [ERR_MSG.format(asset.start_webhook_endpoint)]
-    if not validators.url(asset.success_webhook_endpoint):
-        errors[ON_SUCCESS] = [ERR_MSG.format(asset.success_webhook_endpoint)]
-    if not validators.url(asset.failure_webhook_endpoint):
-        errors[ON_FAILURE] = [ERR_MSG.format(asset.failure_webhook_endpoint)]
-    if errors:
-        record_errors(asset.id, errors, caller="validate_webhook_urls")
+    for hook_name in (ON_START, ON_SUCCESS, ON_FAILURE):
+        endpoint = get_hook(snapshot, hook_name)
+        if endpoint is None:
+            errors[hook_name] = [ERR_MSG.format(None)]
+        elif not endpoint.is_valid:
+            errors[hook_name] = [ERR_MSG.format(endpoint.url)]
 
-    return asset.id
+    return errors
 
 
-@shared_task(bind=True)
-def validate_asset_path(self, asset_id):
-    """Ensure the file is reachable by the server."""
-    asset = Asset.objects.get(id=asset_id)
+def check_asset_path(snapshot, rules):
+    """Ensure the file is reachable by the server, and isn't too large."""
+    try:
+        size = os.stat(snapshot["path"]).st_size
+    except OSError:
+        return {ON_START: ["Asset path is not reachable."]}
 
-    if not os.path.exists(asset.path):
-        error = {ON_START: ["Asset path is not reachable."]}
-        record_errors(asset.id, error, caller="validate_asset_path")
+    max_bytes = settings.PIPELINE_MAX_BYTES
+    if rules.max_bytes is not None:
+        max_bytes = min(max_bytes, rules.max_bytes)
 
-    return asset.id
+    if size > max_bytes:
+        return {
+            "asset": [
+                f"Assets must be at most {max_bytes} bytes, the provided file is {size} bytes."
+            ]
+        }
 
 
-@shared_task(bind=True)
-def validate_asset_is_image(self, asset_id):
-    """Ensure the file is an image."""
-    asset = Asset.objects.get(id=asset_id)
+def decoded_size(img):
+    """
+    The number of bytes Pillow allocates to decode an image at full size.
+    Multi-band and 32 bit images take 4 bytes per pixel, everything else 1.
+    """
+    pixel_size = 1 if img.mode in ("1", "L", "P") else 4
+    return img.width * img.height * pixel_size
+
+
+def check_asset_is_image(snapshot, rules):
+    """Ensure the file is an image, that fits the worker's memory budget."""
+    max_pixels = settings.PIPELINE_MAX_PIXELS
+    max_decode_bytes = settings.PIPELINE_MAX_DECODE_BYTES
 
-    # Check that the asset is indeed an image.
+    # Check that the asset is indeed an image. Opening it only reads its
+    # header, so the budgets are checked before any pixels are decoded.
     try:
-        with Image.open(asset.path) as img:
+        with Image.open(snapshot["path"]) as img:
+            pixels = img.width * img.height
+            if pixels > max_pixels:
+                return {
+                    "asset": [
+                        f"Images must have at most {max_pixels} pixels, the provided image has {pixels} pixels."
+                    ]
+                }
+
+            size = decoded_size(img)
+            if size > max_decode_bytes:
+                return {
+                    "asset": [
+                        f"Images must decode into at most {max_decode_bytes} bytes, the provided image decodes into {size} bytes."
+                    ]
+                }
+
             img.verify()
     except UnidentifiedImageError:
-        error = {"asset": ["Asset is not an image."]}
-        record_errors(asset.id, error, caller="validate_asset_is_image")
+        return {"asset": ["Asset is not an image."]}
+    except Image.DecompressionBombError:
+        return {"asset": [f"Images must have at most {max_pixels} pixels."]}
     except:
         pass
 
-    return asset.id
-
-
-@shared_task(bind=True)
-def validate_asset_is_jpeg(self, asset_id):
-    """Ensure the file is a JPEG."""
-    asset = Asset.objects.get(id=asset_id)
 
+def check_asset_is_jpeg(snapshot, rules):
+    """Ensure the file is in one of the allowed formats, JPEG by default."""
     # NOTE(jake): Though it is common to use the file extension to determine the
     # file type, this can be spoofed or incorrect. Instead we open the file and
     # explicitly check the file signature via Pillow.
     try:
-        with Image.open(asset.path) as img:
-            if img.format != "JPEG":
-                error = {
+        with Image.open(snapshot["path"]) as img:
+            if img.format not in rules.formats:
+                if len(rules.formats) == 1:
+                    expected = f"a {rules.formats[0]}"
+                else:
+                    expected = f"one of {', '.join(rules.formats)}"
+
+                return {
                     "asset": [
-                        f"Assets must be a JPEG, the provided image is a {img.format}"
+                        f"Assets must be {expected}, the provided image is a {img.format}"
                     ]
                 }
-                record_errors(asset.id, error, caller="validate_asset_is_jpeg")
     except:
         pass
 
-    return asset.id
 
+def check_asset_downscale(snapshot, rules):
+    """
+    Write a copy of an image that's larger than the max dimension, scaled
+    down to fit it, which is validated and delivered in its place.
+    """
+    try:
+        with Image.open(snapshot["path"]) as img:
+            if max(img.size) <= rules.max_dimension:
+                return
+    except:
+        return
+
+    from validatr.pipeline.derivatives import downscale
+
+    output_path = os.path.join(
+        settings.PIPELINE_DERIVATIVES_DIR, f"{snapshot['id']}.jpg"
+    )
+    try:
+        offload(downscale, snapshot["path"], output_path, rules.max_dimension)
+    except DecodePoolError:
+        raise
+    except (BrokenProcessPool, MemoryError):
+        return {"asset": ["Image ran out of memory while downscaling."]}
+    except:
+        return {"asset": ["Image could not be downscaled."]}
 
-@shared_task(bind=True)
-def validate_asset_dimensions(self, asset_id):
-    asset = Asset.objects.get(id=asset_id)
+    snapshot["derivative"] = output_path
 
-    MAX_DIMENSION = 1000
 
+def check_asset_dimensions(snapshot, rules):
+    # A downscaled image's derivative is checked in place of the original.
     try:
-        with Image.open(asset.path) as img:
-            if img.width > MAX_DIMENSION or img.height > MAX_DIMENSION:
-                error = {
+        with Image.open(snapshot.get("derivative") or snapshot["path"]) as img:
+            if img.width > rules.max_dimension or img.height > rules.max_dimension:
+                return {
                     "asset": [
-                        f"Image dimensions must have a width and height smaller than 1000px. The provided image has dimensions of {img.width}x{img.height}px.",
+                        f"Image dimensions must have a width and height smaller than {rules.max_dimension}px. The provided image has dimensions of {img.width}x{img.height}px.",
+                    ]
+                }
+            if img.width < rules.min_dimension or img.height < rules.min_dimension:
+                return {
+                    "asset": [
+                        f"Image dimensions must have a width and height of at least {rules.min_dimension}px. The provided image has dimensions of {img.width}x{img.height}px.",
                     ]
                 }
-                record_errors(asset.id, error, caller="validate_asset_dimensions")
     except:
         pass
-    return asset.id
+
+
+def check_asset_decodes(snapshot, rules):
+    """Ensure the whole image decodes, not just its header."""
+    from validatr.pipeline.pixels import decode_image
+
+    try:
+        offload(decode_image, snapshot["path"])
+    except DecodePoolError:
+        raise
+    except (BrokenProcessPool, MemoryError):
+        return {"asset": ["Image ran out of memory while decoding."]}
+    except:
+        return {"asset": ["Image data is corrupt and can't be decoded."]}
+
+
+def check_asset_pixels(snapshot, rules):
+    """Reject blank, truncated, or badly exposed images."""
+    MIN_STDDEV = 4.0
+    MIN_ENTROPY = 2.0
+    MIN_MEAN = 16.0
+    MAX_MEAN = 240.0
+    MAX_TRUNCATED = 0.05
+
+    try:
+        # NumPy is only imported by workers that actually run the pixel checks.
+        from validatr.pipeline.pixels import measure_pixels
+
+        stats = offload(measure_pixels, snapshot["path"])
+    except DecodePoolError:
+        raise
+    except:
+        return
+
+    errors = []
+    if stats["truncated"] > MAX_TRUNCATED:
+        errors.append(
+            f"Image data is truncated, {stats['truncated']:.0%} of the image is missing."
+        )
+
+    if stats["stddev"] < MIN_STDDEV or stats["entropy"] < MIN_ENTROPY:
+        errors.append("Image is blank or nearly uniform.")
+    elif stats["mean"] < MIN_MEAN:
+        errors.append("Image is too dark.")
+    elif stats["mean"] > MAX_MEAN:
+        errors.append("Image is overexposed.")
+
+    if errors:
+        return {"asset": errors}
+
+
+def check_asset_is_unique(snapshot, rules):
+    """Ensure the image isn't a near-duplicate of an accepted asset."""
+    try:
+        from validatr.pipeline.dedupe import find_duplicate, phash
+
+        snapshot["phash"] = phash(snapshot["path"])
+    except:
+        return
+
+    match = find_duplicate(snapshot["phash"])
+    if match:
+        duplicate_id, distance = match
+        return {
+            "asset": [
+                f"Asset is a near-duplicate of asset {duplicate_id}, with a perceptual hash distance of {distance}."
+            ]
+        }
+
+
+# Maps each validator name to the check it performs.
+CHECKS = {
+    "validate_webhook_urls": check_webhook_urls,
+    "validate_asset_path": check_asset_path,
+    "validate_asset_is_image": check_asset_is_image,
+    "validate_asset_is_jpeg": check_asset_is_jpeg,
+    "validate_asset_downscale": check_asset_downscale,
+    "validate_asset_dimensions": check_asset_dimensions,
+    "validate_asset_decodes": check_asset_decodes,
+    "validate_asset_pixels": check_asset_pixels,
+    "validate_asset_is_unique": check_asset_is_unique,
+}
+
+# Groups of validators that don't depend on one another, run concurrently in
+# parallel mode. Validators within a branch run in order.
+PARALLEL_BRANCHES = [
+    ["validate_webhook_urls"],
+    [
+        "validate_asset_path",
+        "validate_asset_is_image",
+        "validate_asset_is_jpeg",
+        "validate_asset_downscale",
+        "validate_asset_dimensions",
+        "validate_asset_decodes",
+        "validate_asset_pixels",
+        "validate_asset_is_unique",
+    ],
+]
+
+# The validators each validator depends on. When `PIPELINE_FAIL_FAST` is on,
+# a validator is skipped if any of its dependencies failed or was skipped;
+# there is no point opening a file that isn't reachable, or checking the
+# format of something that isn't an image.
+REQUIRES = {
+    "validate_webhook_urls": [],
+    "validate_asset_path": [],
+    "validate_asset_is_image": ["validate_asset_path"],
+    "validate_asset_is_jpeg": ["validate_asset_is_image"],
+    "validate_asset_downscale": ["validate_asset_is_jpeg"],
+    "validate_asset_dimensions": [
+        "validate_asset_is_image",
+        "validate_asset_downscale",
+    ],
+    "validate_asset_decodes": ["validate_asset_dimensions"],
+    "validate_asset_pixels": ["validate_asset_is_image"],
+    "validate_asset_is_unique": ["validate_asset_is_image"],
+}
+
+
+def enabled_validators(rules):
+    """The names of the validators to run against an asset, in order."""
+    names = list(CHECKS)
+    if not settings.PIPELINE_DEEP_VERIFY:
+        names.remove("validate_asset_decodes")
+    if not rules.downscale:
+        names.remove("validate_asset_downscale")
+    if not rules.pixel_checks:
+        names.remove("validate_asset_pixels")
+    if not settings.PIPELINE_DEDUPE:
+        names.remove("validate_asset_is_unique")
+
+    return names
+
+
+def dependents(name):
+    """All validators that depend on `name`, directly or transitively."""
+    found = set()
+    for other, requires in REQUIRES.items():
+        if name in requires:
+            found.add(other)
+            found |= dependents(other)
+
+    return found
+
+
+def skip_dependents(task, name):
+    """
+    Drop every validator that depends on a failed validator from the rest of
+    the task's chain, so a failing asset goes straight to `end_pipeline`.
+    """
+    if not settings.PIPELINE_FAIL_FAST or not task.request.chain:
+        return
+
+    skipped = dependents(name)
+
+    # `request.chain` holds the remaining signatures, in reverse order.
+    task.request.chain = [
+        sig
+        for sig in task.request.chain
+        if sig["task"].rsplit(".", 1)[-1] not in skipped
+    ]
+
+
+def apply_check(snapshot, name):
+    """
+    Run a single named check against the asset snapshot, recording any errors.
+
+    Returns True if the check passed.
+    """
+    with profile_check(snapshot, name):
+        errors = CHECKS[name](snapshot, get_rules(snapshot))
+    if errors:
+        record_errors(snapshot, errors, caller=name)
+
+    return not errors
+
+
+@shared_task
+def validate_branch(payload, names):
+    """Run a branch of validators in order, within a single task."""
+    snapshot = load_snapshot(payload)
+
+    failed = set()
+    for name in names:
+        if settings.PIPELINE_FAIL_FAST and failed.intersection(REQUIRES[name]):
+            failed.add(name)
+            continue
+
+        if not apply_check(snapshot, name):
+            failed.add(name)
+
+    return snapshot
+
+
+def save_checkpoint(snapshot, name, passed):
+    """
+    Record that a validator has finished, along with the errors recorded so
+    far, so that a stalled pipeline can be resumed after it.
+
+    Returns False, without saving, if the asset has since been resumed by
+    another chain, in which case this one is stale.
+    """
+    snapshot.setdefault("done", []).append(name)
+    if not passed:
+        snapshot.setdefault("failed", []).append(name)
+
+    checkpoint = {
+        key: snapshot[key]
+        for key in ("done", "failed", "errors", "phash", "derivative", "attempt")
+        if key in snapshot
+    }
+
+    attempt = snapshot.get("attempt", 0)
+    current = Q(checkpoint__attempt=attempt)
+    if not attempt:
+        current |= Q(checkpoint__isnull=True) | ~Q(checkpoint__has_key="attempt")
+
+    saved = Asset.objects.filter(current, id=snapshot["id"]).update(
+        checkpoint=checkpoint, updated_at=timezone.now()
+    )
+    return bool(saved)
+
+
+def run_validator(task, payload, name):
+    """Run a single validator as its own step of the pipeline chain."""
+    snapshot = load_snapshot(payload)
+
+    passed = apply_check(snapshot, name)
+    if not passed:
+        skip_dependents(task, name)
+
+    if settings.PIPELINE_CHECKPOINT and not save_checkpoint(snapshot, name, passed):
+        print(f"Stale Pipeline Stopped: id:{snapshot['id']} after:{name}")
+        task.request.chain = None
+
+    return snapshot
+
+
+@shared_task(bind=True, ignore_result=True)
+def validate_webhook_urls(self, payload):
+    """Check that the webhook urls are valid."""
+    return run_validator(self, payload, "validate_webhook_urls")
+
+
+@shared_task(bind=True, ignore_result=True)
+def validate_asset_path(self, payload):
+    """Ensure the file is reachable by the server."""
+    return run_validator(self, payload, "validate_asset_path")
+
+
+@shared_task(bind=True, ignore_result=True)
+def validate_asset_is_image(self, payload):
+    """Ensure the file is an image."""
+    return run_validator(self, payload, "validate_asset_is_image")
+
+
+@shared_task(bind=True, ignore_result=True)
+def validate_asset_is_jpeg(self, payload):
+    """Ensure the file is a JPEG."""
+    return run_validator(self, payload, "validate_asset_is_jpeg")
+
+
+@shared_task(bind=True, ignore_result=True)
+def validate_asset_downscale(self, payload):
+    """Downscale the image if it's larger than the max dimension."""
+    return run_validator(self, payload, "validate_asset_downscale")
+
+
+@shared_task(bind=True, ignore_result=True)
+def validate_asset_dimensions(self, payload):
+    return run_validator(self, payload, "validate_asset_dimensions")
+
+
+@shared_task(bind=True, ignore_result=True)
+def validate_asset_decodes(self, payload):
+    """Ensure the whole image decodes."""
+    return run_validator(self, payload, "validate_asset_decodes")
+
+
+@shared_task(bind=True, ignore_result=True)
+def validate_asset_pixels(self, payload):
+    """Ensure the image content is usable by labelers."""
+    return run_validator(self, payload, "validate_asset_pixels")
+
+
+@shared_task(bind=True, ignore_result=True)
+def validate_asset_is_unique(self, payload):
+    """Ensure the image isn't a near-duplicate of an accepted asset."""
+    return run_validator(self, payload, "validate_asset_is_unique")
+
+
+VALIDATOR_TASKS = {
+    "validate_webhook_urls": validate_webhook_urls,
+    "validate_asset_path": validate_asset_path,
+    "validate_asset_is_image": validate_asset_is_image,
+    "validate_asset_is_jpeg": validate_asset_is_jpeg,
+    "validate_asset_downscale": validate_asset_downscale,
+    "validate_asset_dimensions": validate_asset_dimensions,
+    "validate_asset_decodes": validate_asset_decodes,
+    "validate_asset_pixels": validate_asset_pixels,
+    "validate_asset_is_unique": validate_asset_is_unique,
+}
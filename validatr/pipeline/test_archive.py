@@ -0,0 +1,107 @@
+import gzip
+import json
+import os
+import tempfile
+
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from validatr.api.models import Asset, ImageHash, ProfileReport
+from validatr.pipeline.archive import archive_assets, archive_expired_assets
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.output_dir = tmp_dir.name
+
+        self.now = timezone.now()
+        self.expired = []
+        for state in ["complete", "failed", "complete"]:
+            asset = Asset.objects.create(
+                path="./assets/200-ok.jpg",
+                state=state,
+                start_webhook_endpoint="http://fake-start-endpoint.com/",
+            )
+            self.expired.append(asset)
+
+        ImageHash.objects.create(asset_id=self.expired[0].id, phash=-42)
+        ProfileReport.objects.create(
+            asset=self.expired[0],
+            validator="validate_asset_path",
+            kind="cprofile",
+            duration_ms=1.0,
+            stats="",
+        )
+
+        # Assets still in the pipeline are kept, however old they are.
+        self.in_progress = Asset.objects.create(
+            path="./assets/200-ok.jpg", state="in_progress"
+        )
+        Asset.objects.filter(id__in=[a.id for a in self.expired]).update(
+            created_at=self.now - timedelta(days=40)
+        )
+        Asset.objects.filter(id=self.in_progress.id).update(
+            created_at=self.now - timedelta(days=40)
+        )
+
+        self.recent = Asset.objects.create(path="./assets/200-ok.jpg", state="complete")
+
+    def test_archive_assets(self):
+        cutoff = self.now - timedelta(days=30)
+        archived, path = archive_assets(cutoff, self.output_dir, chunk_size=2)
+        self.assertEqual(archived, 3)
+
+        # Each chunk is its own gzip member, which read back as one stream.
+        with gzip.open(path, "rt") as f:
+            rows = [json.loads(line) for line in f]
+
+        self.assertEqual(
+            [row["id"] for row in rows],
+            sorted(str(asset.id) for asset in self.expired),
+        )
+        first = next(row for row in rows if row["id"] == str(self.expired[0].id))
+        self.assertEqual(first["state"], "complete")
+        self.assertEqual(first["start_webhook"], "http://fake-start-endpoint.com/")
+        self.assertEqual(first["phash"], -42)
+
+        self.assertEqual(
+            set(Asset.objects.values_list("id", flat=True)),
+            {self.in_progress.id, self.recent.id},
+        )
+        # Hashes are kept, so archived assets still count as near-duplicates.
+        self.assertEqual(ImageHash.objects.get(phash=-42).asset_id, self.expired[0].id)
+        self.assertFalse(ProfileReport.objects.exists())
+
+        # Nothing is left to archive, so no file is written.
+        self.assertEqual(archive_assets(cutoff, self.output_dir), (0, None))
+
+    def test_archive_assets_removes_derivatives(self):
+        derivative = os.path.join(self.output_dir, f"{self.expired[0].id}.jpg")
+        open(derivative, "wb").close()
+        missing = os.path.join(self.output_dir, f"{self.expired[1].id}.jpg")
+        kept = os.path.join(self.output_dir, f"{self.recent.id}.jpg")
+        open(kept, "wb").close()
+
+        Asset.objects.filter(id=self.expired[0].id).update(derivative_path=derivative)
+        Asset.objects.filter(id=self.expired[1].id).update(derivative_path=missing)
+        Asset.objects.filter(id=self.recent.id).update(derivative_path=kept)
+
+        archived, _ = archive_assets(self.now - timedelta(days=30), self.output_dir)
+        self.assertEqual(archived, 3)
+
+        self.assertFalse(os.path.exists(derivative))
+        self.assertTrue(os.path.exists(kept))
+
+    def test_archive_expired_assets(self):
+        with override_settings(ASSET_ARCHIVE_DIR=self.output_dir):
+            self.assertEqual(archive_expired_assets(), (0, None))
+            self.assertEqual(Asset.objects.count(), 5)
+
+            with override_settings(ASSET_RETENTION_DAYS=30):
+                archived, _ = archive_expired_assets()
+
+        self.assertEqual(archived, 3)
@@ -0,0 +1,120 @@
+import copy
+import uuid
+
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from validatr.api.models import Asset, Batch
+from validatr.pipeline.tasks import (
+    end_pipeline,
+    notify_batch,
+    snapshot_asset,
+    start_pipeline,
+)
+
+
+@patch("validatr.pipeline.tasks.webhook_post")
+class BatchesTestCase(TestCase):
+    def setUp(self):
+        self.batch = Batch.objects.create(
+            name="nightly",
+            complete_webhook_endpoint="http://fake-complete-endpoint.com/",
+        )
+
+        self.assets = []
+        for path in ["./assets/200-ok.jpg", "./assets/png-screenshot.png"]:
+            Batch.objects.add_assets(self.batch.id)
+            self.assets.append(Asset.objects.create(path=path, batch=self.batch))
+
+    def assertCounters(self, **counters):
+        batch = Batch.objects.get(id=self.batch.id)
+        for state, count in counters.items():
+            self.assertEqual(getattr(batch, state), count, state)
+
+    @patch("validatr.pipeline.tasks.notify_batch.delay")
+    def test_counters(self, notify_delay, webhook_post):
+        self.assertCounters(total=2, queued=2)
+
+        snapshots = [start_pipeline(snapshot_asset(asset)) for asset in self.assets]
+        self.assertCounters(queued=0, in_progress=2)
+
+        # A redelivered task doesn't move the asset, or its batch, again.
+        start_pipeline(snapshot_asset(self.assets[0]))
+        self.assertCounters(queued=0, in_progress=2)
+
+        snapshots[1]["errors"] = {"asset": ["Assets must be a JPEG"]}
+        end_pipeline(snapshots[0])
+        end_pipeline(snapshots[1])
+        self.assertCounters(in_progress=0, complete=1, failed=1)
+
+        # The batch isn't complete until it's closed.
+        notify_delay.assert_not_called()
+        Batch.objects.filter(id=self.batch.id).update(closed=True)
+        self.assertTrue(Batch.objects.finish(self.batch.id))
+        self.assertFalse(Batch.objects.finish(self.batch.id))
+
+        # Assets can't be added to a closed batch.
+        self.assertFalse(Batch.objects.add_assets(self.batch.id))
+        self.assertCounters(total=2)
+
+    @patch("validatr.pipeline.tasks.notify_batch.delay")
+    def test_stale_runs_dont_move_finished_assets(self, notify_delay, webhook_post):
+        snapshot = start_pipeline(snapshot_asset(self.assets[0]))
+        end_pipeline(copy.deepcopy(snapshot))
+        webhook_post.reset_mock()
+
+        # A second run of the pipeline, enqueued again or resumed, neither
+        # restarts nor fails the asset, nor notifies anyone.
+        start_pipeline(snapshot_asset(self.assets[0]))
+        snapshot["errors"] = {"asset": ["Assets must be a JPEG"]}
+        end_pipeline(snapshot)
+
+        self.assertEqual(Asset.objects.get(id=self.assets[0].id).state, "complete")
+        self.assertCounters(total=2, queued=1, in_progress=0, complete=1, failed=0)
+        webhook_post.assert_not_called()
+
+    def test_redelivered_start_carries_on(self, webhook_post):
+        snapshot = snapshot_asset(self.assets[0])
+        snapshot["run"] = str(uuid.uuid4())
+        start_pipeline(copy.deepcopy(snapshot))
+
+        def remaining_chain(run):
+            start_pipeline.push_request(chain=[{"task": "end_pipeline"}])
+            try:
+                start_pipeline.run({**copy.deepcopy(snapshot), "run": run})
+                return start_pipeline.request.chain
+            finally:
+                start_pipeline.pop_request()
+
+        # The run that started the asset, redelivered after a crash, carries
+        # on, while another run of the pipeline is dropped.
+        self.assertEqual(remaining_chain(snapshot["run"]), [{"task": "end_pipeline"}])
+        self.assertIsNone(remaining_chain(str(uuid.uuid4())))
+        self.assertCounters(queued=1, in_progress=1)
+
+    @patch("validatr.pipeline.tasks.notify_batch.delay")
+    def test_completes_closed_batch(self, notify_delay, webhook_post):
+        Batch.objects.filter(id=self.batch.id).update(closed=True)
+
+        for asset in self.assets:
+            end_pipeline(start_pipeline(snapshot_asset(asset)))
+
+        notify_delay.assert_called_once_with(str(self.batch.id))
+        self.assertIsNotNone(Batch.objects.get(id=self.batch.id).completed_at)
+
+    def test_notify_batch(self, webhook_post):
+        Batch.objects.filter(id=self.batch.id).update(complete=1, failed=1)
+
+        notify_batch(str(self.batch.id))
+        webhook_post.assert_called_once_with(
+            "http://fake-complete-endpoint.com/",
+            {
+                "id": str(self.batch.id),
+                "state": "complete",
+                "total": 2,
+                "complete": 1,
+                "failed": 1,
+            },
+            idempotency_key=f"batch:{self.batch.id}",
+        )
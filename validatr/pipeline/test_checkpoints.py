@@ -0,0 +1,103 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from validatr.api.models import Asset
+from validatr.pipeline.tasks import (
+    reap_stalled_assets,
+    record_errors,
+    run_validator,
+    snapshot_asset,
+    validate_asset_is_image,
+    validate_asset_path,
+)
+
+
+def _task_names(pipeline):
+    return [sig.task.rsplit(".", 1)[-1] for sig in pipeline]
+
+
+@override_settings(PIPELINE_CHECKPOINT=True)
+class CheckpointsTestCase(TestCase):
+    def setUp(self):
+        self.asset = Asset.objects.create(
+            path="./assets/not-an-image.txt", state="in_progress"
+        )
+
+    def test_record_errors_is_idempotent(self):
+        snapshot = snapshot_asset(self.asset)
+        record_errors(snapshot, {"asset": ["Asset is not an image."]})
+        record_errors(snapshot, {"asset": ["Asset is not an image.", "Other."]})
+
+        self.assertEqual(
+            snapshot["errors"], {"asset": ["Asset is not an image.", "Other."]}
+        )
+
+    def test_checkpoint_after_each_validator(self):
+        snapshot = validate_asset_path(snapshot_asset(self.asset))
+        validate_asset_is_image(snapshot)
+
+        self.asset.refresh_from_db()
+        self.assertEqual(
+            self.asset.checkpoint,
+            {
+                "done": ["validate_asset_path", "validate_asset_is_image"],
+                "failed": ["validate_asset_is_image"],
+                "errors": {"asset": ["Asset is not an image."]},
+            },
+        )
+
+    @patch("validatr.pipeline.tasks.chain")
+    def test_reap_stalled_assets(self, chain):
+        validate_asset_is_image(validate_asset_path(snapshot_asset(self.asset)))
+
+        # Assets that have made progress recently are left alone.
+        self.assertEqual(reap_stalled_assets(), 0)
+
+        Asset.objects.filter(id=self.asset.id).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(reap_stalled_assets(), 1)
+
+        # The pipeline resumes after the last finished validator, skipping
+        # those that depend on the failed one.
+        pipeline = chain.call_args.args[0]
+        self.assertEqual(
+            _task_names(pipeline), ["validate_webhook_urls", "end_pipeline"]
+        )
+        self.assertEqual(
+            pipeline[0].args[0]["errors"], {"asset": ["Asset is not an image."]}
+        )
+
+        # The reaper claimed the asset, so it isn't resumed twice.
+        self.assertEqual(reap_stalled_assets(), 0)
+
+    @patch("validatr.pipeline.tasks.chain")
+    def test_stale_chain_exits(self, chain):
+        stale = validate_asset_path(snapshot_asset(self.asset))
+
+        Asset.objects.filter(id=self.asset.id).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(reap_stalled_assets(), 1)
+        self.assertEqual(chain.call_args.args[0][0].args[0]["attempt"], 1)
+
+        # The chain the asset was resumed from runs its next validator, but
+        # doesn't overwrite the checkpoint, and drops the rest of its chain.
+        task = SimpleNamespace(request=SimpleNamespace(chain=[]))
+        run_validator(task, stale, "validate_asset_is_image")
+        self.assertIsNone(task.request.chain)
+
+        self.asset.refresh_from_db()
+        self.assertEqual(self.asset.checkpoint["done"], ["validate_asset_path"])
+        self.assertEqual(self.asset.checkpoint["attempt"], 1)
+
+    @override_settings(PIPELINE_CHECKPOINT=False)
+    def test_reap_stalled_assets_without_checkpoints(self):
+        Asset.objects.filter(id=self.asset.id).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(reap_stalled_assets(), 0)
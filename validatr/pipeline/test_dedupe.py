@@ -0,0 +1,160 @@
+import os
+import tempfile
+
+from unittest.mock import patch
+
+import numpy as np
+
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from validatr.api.models import Asset
+from validatr.pipeline import dedupe
+from validatr.pipeline.dedupe import (
+    HashIndex,
+    build_snapshot,
+    find_duplicate,
+    index_asset,
+    phash,
+)
+from validatr.pipeline.tasks import snapshot_asset, validate_asset_is_unique
+
+
+def _create_asset(path):
+    return Asset.objects.create(
+        path=path,
+        start_webhook_endpoint="http://fake-start-endpoint.com/",
+        success_webhook_endpoint="http://fake-success-endpoint.com/",
+        failure_webhook_endpoint="http://fake-failure-endpoint.com/",
+    )
+
+
+class DedupeTestCase(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        # A smaller, re-encoded copy of 200-ok.jpg.
+        self.copy_path = os.path.join(tmp_dir.name, "copy.jpg")
+        with Image.open("./assets/200-ok.jpg") as img:
+            img.resize((300, 240)).save(self.copy_path, quality=60)
+
+        # Every test starts with empty indexes in this worker.
+        for name, value in [
+            ("_snapshot", HashIndex()),
+            ("_snapshot_name", None),
+            ("_index", HashIndex()),
+            ("_last_id", 0),
+            ("_local_ids", set()),
+        ]:
+            patcher = patch.object(dedupe, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = patch.object(dedupe, "REFRESH_SECONDS", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_phash(self):
+        original = phash("./assets/200-ok.jpg")
+
+        self.assertLessEqual(bin(original ^ phash(self.copy_path)).count("1"), 2)
+        self.assertGreater(bin(original ^ phash("./assets/yuge.jpg")).count("1"), 20)
+
+    def test_hash_index(self):
+        index = HashIndex()
+        index.add(0b1111, 1)
+        index.merge()
+        index.add(0xFF00FF00, 2)
+
+        self.assertEqual(index.nearest(0b1110), (1, 1))
+        self.assertEqual(index.nearest(0xFF00FF00 ^ (1 << 40)), (2, 1))
+        self.assertIsNone(index.nearest(0xFFFF0000FFFF0000))
+        self.assertEqual(len(index), 2)
+
+    def test_incremental_merge(self):
+        rng = np.random.default_rng(0)
+        hashes = rng.integers(0, 2**63, 3000, dtype=np.uint64)
+
+        # Merged in two goes, each growing the pending buffer, the tables
+        # match those built in one.
+        index = HashIndex()
+        for start in range(0, 3000, 1500):
+            for row_id in range(start, start + 1500):
+                index.add(int(hashes[row_id]), row_id)
+            index.merge()
+
+        built = HashIndex.build(hashes, np.arange(3000, dtype=np.int64))
+        for chunk in range(dedupe.CHUNKS):
+            np.testing.assert_array_equal(index.keys[chunk], built.keys[chunk])
+            np.testing.assert_array_equal(
+                hashes[index.order[chunk]], hashes[built.order[chunk]]
+            )
+
+        self.assertEqual(index.nearest(int(hashes[1234]) ^ 0b101), (1234, 2))
+
+    def test_validate_asset_is_unique(self):
+        original = _create_asset("./assets/200-ok.jpg")
+
+        snapshot = validate_asset_is_unique(snapshot_asset(original))
+        self.assertEqual(snapshot["errors"], {})
+        index_asset(snapshot["id"], snapshot["phash"])
+
+        snapshot = validate_asset_is_unique(
+            snapshot_asset(_create_asset(self.copy_path))
+        )
+        self.assertIn(
+            f"Asset is a near-duplicate of asset {original.id}",
+            snapshot["errors"]["asset"][0],
+        )
+
+        snapshot = validate_asset_is_unique(
+            snapshot_asset(_create_asset("./assets/yuge.jpg"))
+        )
+        self.assertEqual(snapshot["errors"], {})
+
+    def test_index_asset_is_seen_by_this_worker(self):
+        original = _create_asset("./assets/200-ok.jpg")
+        dedupe.get_index()
+
+        # Before this worker's next refresh, it already matches its own hashes.
+        with patch.object(dedupe, "REFRESH_SECONDS", 3600):
+            index_asset(original.id, phash(original.path))
+            match = find_duplicate(phash(self.copy_path))
+            self.assertEqual(match[0], str(original.id))
+
+        # The row isn't indexed a second time when the worker refreshes.
+        snapshot, index = dedupe.get_index()
+        self.assertEqual(len(index), 1)
+
+    def test_snapshot(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        original = _create_asset("./assets/200-ok.jpg")
+        index_asset(original.id, phash(original.path))
+
+        with override_settings(PIPELINE_DEDUPE_SNAPSHOT_DIR=tmp_dir.name):
+            self.assertEqual(build_snapshot(), 1)
+
+            # The snapshot is mapped, and only newer hashes are indexed.
+            other = _create_asset("./assets/yuge.jpg")
+            index_asset(other.id, phash(other.path))
+            snapshot, index = dedupe.get_index()
+            self.assertEqual((len(snapshot), len(index)), (1, 1))
+            self.assertIsInstance(snapshot.hashes, np.memmap)
+
+            match = find_duplicate(phash(self.copy_path))
+            self.assertEqual(match[0], str(original.id))
+
+            # Archived assets are still matched.
+            Asset.objects.filter(id=original.id).delete()
+            match = find_duplicate(phash(self.copy_path))
+            self.assertEqual(match[0], str(original.id))
+
+            build_snapshot()
+            build_snapshot()
+            self.assertEqual(
+                len([name for name in os.listdir(tmp_dir.name) if "snapshot" in name]),
+                2,
+            )
@@ -0,0 +1,52 @@
+import time
+
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from validatr.api.models import Asset, ProfileReport
+from validatr.pipeline import profiling
+from validatr.pipeline.tasks import (
+    CHECKS,
+    snapshot_asset,
+    validate_asset_is_image,
+    validate_asset_path,
+)
+
+
+def _slow_check(snapshot, rules):
+    time.sleep(0.1)
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        self.asset = Asset.objects.create(path="./assets/200-ok.jpg")
+
+    def test_disabled(self):
+        validate_asset_is_image(snapshot_asset(self.asset))
+        self.assertFalse(ProfileReport.objects.exists())
+
+    def test_profiling_flag(self):
+        snapshot = snapshot_asset(self.asset)
+        snapshot["profiling"] = True
+        validate_asset_is_image(snapshot)
+
+        report = ProfileReport.objects.get(asset=self.asset)
+        self.assertEqual(report.validator, "validate_asset_is_image")
+        self.assertEqual(report.kind, "cprofile")
+        self.assertIn("check_asset_is_image", report.stats)
+
+    @override_settings(PIPELINE_PROFILE_SLOW_MS=20)
+    def test_slow_validator_is_sampled(self):
+        validate_asset_is_image(snapshot_asset(self.asset))
+        self.assertFalse(ProfileReport.objects.exists())
+
+        with patch.dict(CHECKS, {"validate_asset_path": _slow_check}):
+            validate_asset_path(snapshot_asset(self.asset))
+
+        report = ProfileReport.objects.get(asset=self.asset)
+        self.assertEqual(report.validator, "validate_asset_path")
+        self.assertEqual(report.kind, "sampled")
+        self.assertGreaterEqual(report.duration_ms, 100)
+        self.assertIn("_slow_check", report.stats)
+        self.assertFalse(profiling._running)
@@ -0,0 +1,32 @@
+import json
+import subprocess
+import sys
+
+from celery import Task
+from django.test import SimpleTestCase
+
+from validatr.pipeline import tasks
+
+from validatr.api.management.commands.benchmark_startup import (
+    BOOT_SCRIPT,
+    HEAVY_MODULES,
+)
+
+
+class StartupTestCase(SimpleTestCase):
+    def test_worker_boot_is_slim(self):
+        output = subprocess.run(
+            [sys.executable, "-c", f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{BOOT_SCRIPT}"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+
+        # Every pipeline task is registered, without the API or NumPy loaded.
+        expected = sorted(
+            task.name for task in vars(tasks).values() if isinstance(task, Task)
+        )
+        self.assertIn("validatr.pipeline.tasks.start_pipeline", expected)
+        self.assertEqual(result["tasks"], expected)
+        self.assertEqual(result["loaded"], [])
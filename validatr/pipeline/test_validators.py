@@ -1,27 +1,58 @@
+import copy
+import os
+import tempfile
+
+from types import SimpleNamespace
 from unittest.mock import patch
 
-from django.test import TestCase
+import billiard
+
+from django.test import TestCase, override_settings
+from PIL import Image
 
 
-from validatr.api.models import Asset
+from validatr.api.models import Asset, ValidationProfile, WebhookEndpoint
+from validatr.api.assets.serializers import GetCompleteAssetResponseSerializer
+from validatr.api.profiles.serializers import ValidationProfileSerializer
+from validatr.pipeline.offload import DecodePoolError, check_worker_pool, offload
+from validatr.pipeline.pixels import decode_image
+from validatr.pipeline.profiles import load_rules
 from validatr.pipeline.tasks import (
     validate_asset_path,
     validate_asset_is_image,
     validate_asset_is_jpeg,
     validate_asset_dimensions,
+    validate_asset_decodes,
+    validate_asset_downscale,
     validate_webhook_urls,
+    validate_asset_pixels,
+    validate_branch,
+    end_pipeline,
+    load_snapshot,
+    snapshot_asset,
+    skip_dependents,
+    PARALLEL_BRANCHES,
 )
 
 
-def _create_asset(path):
+def _create_asset(path, profile=None):
     return Asset.objects.create(
         path=path,
+        profile=profile,
         start_webhook_endpoint="http://fake-start-endpoint.com/",
         success_webhook_endpoint="http://fake-success-endpoint.com/",
         failure_webhook_endpoint="http://fake-failure-endpoint.com/",
     )
 
 
+def _offload_in_worker(path):
+    """Offload a decode from a prefork worker process."""
+    try:
+        offload(decode_image, path)
+    except DecodePoolError as exc:
+        return str(exc)
+
+
 class ValidatorsTestCase(TestCase):
     def setUp(self):
         self.text_asset = _create_asset("./assets/not-an-image.txt")
@@ -38,60 +69,344 @@ class ValidatorsTestCase(TestCase):
             success_webhook_endpoint="wat",
             failure_webhook_endpoint="wat",
         )
-        resp = validate_webhook_urls(asset_with_invalid_hooks.id)
-
-        post_validation_asset = Asset.objects.get(id=asset_with_invalid_hooks.id)
+        snapshot = validate_webhook_urls(snapshot_asset(asset_with_invalid_hooks))
 
         exp_err_msg = "`wat`is not a valid URL"
-        self.assertEqual(post_validation_asset.errors["onStart"], [exp_err_msg])
-        self.assertEqual(post_validation_asset.errors["onSuccess"], [exp_err_msg])
-        self.assertEqual(post_validation_asset.errors["onFailure"], [exp_err_msg])
+        self.assertEqual(snapshot["errors"]["onStart"], [exp_err_msg])
+        self.assertEqual(snapshot["errors"]["onSuccess"], [exp_err_msg])
+        self.assertEqual(snapshot["errors"]["onFailure"], [exp_err_msg])
 
     def test_validate_asset_path(self):
-        validate_asset_path(self.jpeg_asset.id)
-        jpeg_asset = Asset.objects.get(id=self.jpeg_asset.id)
-        self.assertEqual(jpeg_asset.errors, None)
+        snapshot = validate_asset_path(snapshot_asset(self.jpeg_asset))
+        self.assertEqual(snapshot["errors"], {})
 
-        validate_asset_path(self.unreachable_asset.id)
-        unreachable_asset = Asset.objects.get(id=self.unreachable_asset.id)
+        snapshot = validate_asset_path(snapshot_asset(self.unreachable_asset))
         self.assertEqual(
-            unreachable_asset.errors, {"onStart": ["Asset path is not reachable."]}
+            snapshot["errors"], {"onStart": ["Asset path is not reachable."]}
         )
 
     def test_validate_asset_is_image(self):
 
-        validate_asset_is_image(self.jpeg_asset.id)
-        jpeg_asset = Asset.objects.get(id=self.jpeg_asset.id)
-        self.assertEqual(jpeg_asset.errors, None)
+        snapshot = validate_asset_is_image(snapshot_asset(self.jpeg_asset))
+        self.assertEqual(snapshot["errors"], {})
 
-        validate_asset_is_image(self.text_asset.id)
-        unreachable_asset = Asset.objects.get(id=self.text_asset.id)
-        self.assertEqual(
-            unreachable_asset.errors, {"asset": ["Asset is not an image."]}
-        )
+        snapshot = validate_asset_is_image(snapshot_asset(self.text_asset))
+        self.assertEqual(snapshot["errors"], {"asset": ["Asset is not an image."]})
+
+    def test_resource_budgets(self):
+        with override_settings(PIPELINE_MAX_BYTES=100000):
+            snapshot = validate_asset_path(snapshot_asset(self.oversized_asset))
+            self.assertEqual(
+                snapshot["errors"],
+                {
+                    "asset": [
+                        "Assets must be at most 100000 bytes, the provided file is 1106083 bytes."
+                    ]
+                },
+            )
+
+        with override_settings(PIPELINE_MAX_PIXELS=1000000):
+            snapshot = validate_asset_is_image(snapshot_asset(self.oversized_asset))
+            self.assertEqual(
+                snapshot["errors"],
+                {
+                    "asset": [
+                        "Images must have at most 1000000 pixels, the provided image has 5448960 pixels."
+                    ]
+                },
+            )
+
+        with override_settings(PIPELINE_MAX_DECODE_BYTES=1000000):
+            snapshot = validate_asset_is_image(snapshot_asset(self.jpeg_asset))
+            self.assertEqual(
+                snapshot["errors"],
+                {
+                    "asset": [
+                        "Images must decode into at most 1000000 bytes, the provided image decodes into 1800000 bytes."
+                    ]
+                },
+            )
+
+        # Pillow itself refuses to open images over twice its pixel limit.
+        with patch.object(Image, "MAX_IMAGE_PIXELS", 1000000):
+            snapshot = validate_asset_is_image(snapshot_asset(self.oversized_asset))
+            self.assertEqual(
+                snapshot["errors"],
+                {"asset": ["Images must have at most 50000000 pixels."]},
+            )
 
     def test_validate_asset_is_jpeg(self):
 
-        validate_asset_is_jpeg(self.jpeg_asset.id)
-        jpeg_asset = Asset.objects.get(id=self.jpeg_asset.id)
-        self.assertEqual(jpeg_asset.errors, None)
+        snapshot = validate_asset_is_jpeg(snapshot_asset(self.jpeg_asset))
+        self.assertEqual(snapshot["errors"], {})
 
-        validate_asset_is_jpeg(self.png_asset.id)
-        unreachable_asset = Asset.objects.get(id=self.png_asset.id)
+        snapshot = validate_asset_is_jpeg(snapshot_asset(self.png_asset))
         self.assertEqual(
-            unreachable_asset.errors,
+            snapshot["errors"],
             {"asset": ["Assets must be a JPEG, the provided image is a PNG"]},
         )
 
     def test_validate_asset_dimensions(self):
 
-        validate_asset_dimensions(self.jpeg_asset.id)
-        jpeg_asset = Asset.objects.get(id=self.jpeg_asset.id)
-        self.assertEqual(jpeg_asset.errors, None)
+        snapshot = validate_asset_dimensions(snapshot_asset(self.jpeg_asset))
+        self.assertEqual(snapshot["errors"], {})
 
-        validate_asset_dimensions(self.oversized_asset.id)
-        unreachable_asset = Asset.objects.get(id=self.oversized_asset.id)
+        snapshot = validate_asset_dimensions(snapshot_asset(self.oversized_asset))
         self.assertIn(
             "Image dimensions must have a width and height smaller than 1000px.",
-            unreachable_asset.errors["asset"][0],
+            snapshot["errors"]["asset"][0],
+        )
+
+    def test_validate_asset_decodes(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        # The header is intact, but the compressed pixel data is garbage.
+        corrupt_path = os.path.join(tmp_dir.name, "corrupt.png")
+        Image.linear_gradient("L").save(corrupt_path)
+        with open(corrupt_path, "r+b") as f:
+            f.seek(100)
+            f.write(b"\xff" * 64)
+
+        for processes in [0, 1]:
+            with override_settings(PIPELINE_DECODE_PROCESSES=processes):
+                snapshot = validate_asset_decodes(snapshot_asset(self.jpeg_asset))
+                self.assertEqual(snapshot["errors"], {})
+
+                snapshot = validate_asset_decodes(
+                    snapshot_asset(_create_asset(corrupt_path))
+                )
+                self.assertEqual(
+                    snapshot["errors"],
+                    {"asset": ["Image data is corrupt and can't be decoded."]},
+                )
+
+    @override_settings(PIPELINE_DECODE_PROCESSES=1)
+    def test_decode_pool_in_prefork(self):
+        # Celery's prefork pool runs tasks in daemonic billiard processes,
+        # which can't start the decode pool.
+        with billiard.Pool(1) as pool:
+            error = pool.apply(_offload_in_worker, (self.jpeg_asset.path,))
+        self.assertIn("can't be used in the prefork pool", error)
+
+        # Which fails the task, rather than the asset.
+        with patch(
+            "validatr.pipeline.offload.get_pool", side_effect=DecodePoolError
+        ), self.assertRaises(DecodePoolError):
+            validate_asset_decodes(snapshot_asset(self.jpeg_asset))
+
+        # Prefork workers refuse to boot with the decode pool configured.
+        with self.assertRaises(SystemExit):
+            check_worker_pool(SimpleNamespace(pool_cls="prefork"))
+        check_worker_pool(SimpleNamespace(pool_cls="threads"))
+
+    @patch("validatr.pipeline.tasks.webhook_post")
+    def test_validate_asset_downscale(self, webhook_post):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        # Profile ids are reused between tests, so don't leave this one's
+        # rules cached.
+        self.addCleanup(load_rules.cache_clear)
+        profile = ValidationProfile.objects.create(name="downscaled", downscale=True)
+        oversized_asset = _create_asset(self.oversized_asset.path, profile)
+
+        with override_settings(PIPELINE_DERIVATIVES_DIR=tmp_dir.name):
+            snapshot = validate_asset_downscale(snapshot_asset(oversized_asset))
+            self.assertEqual(snapshot["errors"], {})
+
+            # Draft mode decodes at half size, then resamples the rest of the way.
+            derivative = os.path.join(tmp_dir.name, f"{oversized_asset.id}.jpg")
+            self.assertEqual(snapshot["derivative"], derivative)
+            with Image.open(derivative) as img:
+                self.assertEqual(img.format, "JPEG")
+                self.assertEqual(img.size, (1000, 657))
+
+            # The derivative is what the dimensions are checked against.
+            snapshot = validate_asset_dimensions(snapshot)
+            self.assertEqual(snapshot["errors"], {})
+
+            Asset.objects.filter(id=oversized_asset.id).update(state="in_progress")
+            end_pipeline(snapshot)
+            oversized_asset.refresh_from_db()
+            self.assertEqual(oversized_asset.state, "complete")
+            self.assertEqual(oversized_asset.derivative_path, derivative)
+            resp = GetCompleteAssetResponseSerializer(oversized_asset).data
+            self.assertEqual(resp["derivativePath"], derivative)
+
+            # Images that already fit are left alone.
+            jpeg_asset = _create_asset(self.jpeg_asset.path, profile)
+            snapshot = validate_asset_downscale(snapshot_asset(jpeg_asset))
+            self.assertNotIn("derivative", snapshot)
+
+    def test_validate_asset_pixels(self):
+        snapshot = validate_asset_pixels(snapshot_asset(self.jpeg_asset))
+        self.assertEqual(snapshot["errors"], {})
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        blank_path = os.path.join(tmp_dir.name, "blank.jpg")
+        Image.new("RGB", (300, 200), "white").save(blank_path)
+        snapshot = validate_asset_pixels(snapshot_asset(_create_asset(blank_path)))
+        self.assertEqual(
+            snapshot["errors"], {"asset": ["Image is blank or nearly uniform."]}
+        )
+
+        dark_path = os.path.join(tmp_dir.name, "dark.png")
+        Image.linear_gradient("L").point(lambda v: v // 16).save(dark_path)
+        snapshot = validate_asset_pixels(snapshot_asset(_create_asset(dark_path)))
+        self.assertEqual(snapshot["errors"], {"asset": ["Image is too dark."]})
+
+        truncated_path = os.path.join(tmp_dir.name, "truncated.jpg")
+        with Image.open(self.jpeg_asset.path) as img:
+            img.save(truncated_path, progressive=False)
+        with open(truncated_path, "r+b") as f:
+            f.truncate(os.path.getsize(truncated_path) // 2)
+        snapshot = validate_asset_pixels(snapshot_asset(_create_asset(truncated_path)))
+        self.assertIn("Image data is truncated", snapshot["errors"]["asset"][0])
+
+    def test_validation_profile(self):
+        profile = ValidationProfile.objects.create(
+            name="lenient",
+            allowed_formats=["jpeg", "png"],
+            max_dimension=3000,
+            max_bytes=20000,
         )
+
+        png_asset = _create_asset(self.png_asset.path, profile)
+        snapshot = validate_asset_is_jpeg(snapshot_asset(png_asset))
+        self.assertEqual(snapshot["errors"], {})
+
+        oversized_asset = _create_asset(self.oversized_asset.path, profile)
+        snapshot = validate_asset_dimensions(snapshot_asset(oversized_asset))
+        self.assertEqual(snapshot["errors"], {})
+
+        jpeg_asset = _create_asset(self.jpeg_asset.path, profile)
+        snapshot = validate_asset_path(snapshot_asset(jpeg_asset))
+        self.assertIn(
+            "Assets must be at most 20000 bytes", snapshot["errors"]["asset"][0]
+        )
+
+        # Editing the profile bumps its version, which the next snapshot picks up.
+        profile.allowed_formats = ["gif", "png"]
+        profile.save()
+        self.assertEqual(profile.version, 2)
+
+        jpeg_asset.refresh_from_db()
+        snapshot = validate_asset_is_jpeg(snapshot_asset(jpeg_asset))
+        self.assertEqual(
+            snapshot["errors"],
+            {"asset": ["Assets must be one of GIF, PNG, the provided image is a JPEG"]},
+        )
+
+    def test_validation_profile_serializer(self):
+        def _errors(data, instance=None):
+            serializer = ValidationProfileSerializer(instance, data, partial=True)
+            serializer.is_valid()
+            return serializer.errors
+
+        for formats in ["JPEG", [1], [], ["jpeg", "svg"]]:
+            self.assertIn(
+                "allowed_formats", _errors({"name": "p", "allowed_formats": formats})
+            )
+
+        serializer = ValidationProfileSerializer(
+            data={"name": "p", "allowed_formats": ["jpeg", "PNG"], "min_dimension": 100}
+        )
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data["allowed_formats"], ["JPEG", "PNG"])
+
+        self.assertIn("min_dimension", _errors({"name": "p", "min_dimension": 2000}))
+        profile = serializer.save()
+        self.assertIn("min_dimension", _errors({"max_dimension": 10}, profile))
+
+        # Versions are bumped in the db, so a stale copy doesn't reuse one.
+        stale = ValidationProfile.objects.get(id=profile.id)
+        profile.save()
+        stale.save()
+        self.assertEqual((profile.version, stale.version), (2, 3))
+
+    def test_validate_branch_short_circuits(self):
+        file_branch = PARALLEL_BRANCHES[1]
+
+        with patch("validatr.pipeline.tasks.Image.open") as image_open:
+            snapshot = validate_branch(
+                snapshot_asset(self.unreachable_asset), file_branch
+            )
+
+        image_open.assert_not_called()
+        self.assertEqual(
+            snapshot["errors"], {"onStart": ["Asset path is not reachable."]}
+        )
+
+        snapshot = validate_branch(snapshot_asset(self.png_asset), file_branch)
+        self.assertEqual(
+            snapshot["errors"],
+            {"asset": ["Assets must be a JPEG, the provided image is a PNG"]},
+        )
+
+    def test_load_snapshot_from_asset_id(self):
+        snapshot = load_snapshot(self.jpeg_asset.id)
+        self.assertEqual(snapshot["id"], str(self.jpeg_asset.id))
+        self.assertEqual(snapshot["path"], self.jpeg_asset.path)
+
+        # Version 1 snapshots carried webhook urls, rather than endpoint ids.
+        v1_hooks = {"onStart": "wat", "onSuccess": None, "onFailure": None}
+        upgraded = load_snapshot({**snapshot, "v": 1, "hooks": v1_hooks})
+        self.assertEqual(upgraded["v"], 3)
+        self.assertIsNone(upgraded["batch"])
+        self.assertEqual(
+            upgraded["hooks"]["onStart"],
+            WebhookEndpoint.objects.get(url="wat", is_valid=False).id,
+        )
+
+        with self.assertRaises(ValueError):
+            load_snapshot({**snapshot, "v": 0})
+
+    @patch("validatr.pipeline.tasks.webhook_post")
+    def test_end_pipeline_saves_errors(self, webhook_post):
+        # Workers cache webhook endpoints once they've been committed.
+        self.addCleanup(WebhookEndpoint.objects.clear_cache)
+        with self.captureOnCommitCallbacks(execute=True):
+            WebhookEndpoint.objects.get_cached(self.png_asset.failure_webhook_id)
+
+        Asset.objects.filter(id=self.png_asset.id).update(state="in_progress")
+        snapshot = snapshot_asset(self.png_asset)
+        branches = [
+            validate_branch(copy.deepcopy(snapshot), names)
+            for names in PARALLEL_BRANCHES
+        ]
+
+        with self.assertNumQueries(1):
+            end_pipeline(branches)
+
+        png_asset = Asset.objects.get(id=self.png_asset.id)
+        self.assertEqual(png_asset.state, "failed")
+        self.assertEqual(
+            png_asset.errors,
+            {"asset": ["Assets must be a JPEG, the provided image is a PNG"]},
+        )
+        webhook_post.assert_called_once_with(
+            "http://fake-failure-endpoint.com/",
+            {"id": str(png_asset.id), "state": "failed", "errors": png_asset.errors},
+            idempotency_key=f"{png_asset.id}:failed",
+        )
+
+    def test_skip_dependents(self):
+        def _sig(name):
+            return {"task": f"validatr.pipeline.tasks.{name}"}
+
+        remaining = [
+            _sig("end_pipeline"),
+            _sig("validate_asset_dimensions"),
+            _sig("validate_asset_is_jpeg"),
+            _sig("validate_asset_is_image"),
+        ]
+        task = SimpleNamespace(request=SimpleNamespace(chain=list(remaining)))
+
+        skip_dependents(task, "validate_webhook_urls")
+        self.assertEqual(task.request.chain, remaining)
+
+        skip_dependents(task, "validate_asset_path")
+        self.assertEqual(task.request.chain, [_sig("end_pipeline")])
@@ -0,0 +1,45 @@
+from celery import signals
+from django.db import close_old_connections
+from django.db.backends.signals import connection_created
+
+# Print the connections-per-asset metric every this many assets.
+REPORT_EVERY = 1000
+
+# Counters for the current process.
+stats = {"connections": 0, "assets": 0}
+
+
+def count_connection(sender, connection, **kwargs):
+    stats["connections"] += 1
+
+
+def count_asset():
+    """Called once for every asset that finishes the pipeline."""
+    stats["assets"] += 1
+
+    if stats["assets"] % REPORT_EVERY == 0:
+        print(
+            f"db connections: opened:{stats['connections']} assets:{stats['assets']} per_asset:{connections_per_asset():.3f}"
+        )
+
+
+def connections_per_asset():
+    """The number of db connections opened by this process per finished asset."""
+    if not stats["assets"]:
+        return 0.0
+
+    return stats["connections"] / stats["assets"]
+
+
+def close_stale_connections(**kwargs):
+    """
+    Close connections that have outlived CONN_MAX_AGE, or errored, the same
+    way Django does around every HTTP request.
+    """
+    close_old_connections()
+
+
+def install():
+    connection_created.connect(count_connection)
+    signals.task_prerun.connect(close_stale_connections)
+    signals.task_postrun.connect(close_stale_connections)
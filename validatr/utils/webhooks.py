@@ -3,9 +3,13 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 
-def webhook_post(url, body, timeout=10, retries=5, retry_backoff=1.5):
+def webhook_post(
+    url, body, timeout=10, retries=5, retry_backoff=1.5, idempotency_key=None
+):
     """
-    Send a webhook POST request, with exponential backoff retry
+    Send a webhook POST request, with exponential backoff retry. Requests sent
+    more than once for the same event carry the same `Idempotency-Key` header,
+    so that receivers can ignore the repeats.
     """
 
     retry = Retry(
@@ -18,6 +22,10 @@ def webhook_post(url, body, timeout=10, retries=5, retry_backoff=1.5):
     req.mount("https://", adapter)
     req.mount("http://", adapter)
 
-    response = req.post(url, json=body, timeout=timeout)
+    headers = {}
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+
+    response = req.post(url, json=body, headers=headers, timeout=timeout)
 
     return response